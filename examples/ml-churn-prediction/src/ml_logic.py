@@ -11,27 +11,98 @@ Pipeline Steps:
 4. Monitor Setup - Create or update Model Monitor for drift/performance tracking
 """
 
+import hashlib
 import logging
-from datetime import datetime
+import string
+import functools
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import Optional
 from snowflake.snowpark.session import Session
 from snowflake.snowpark import functions as F
 from snowflake.ml.registry import Registry
+from snowflake.ml.model import model_signature
 from snowflake.ml.feature_store import (
     FeatureStore,
     Entity,
     FeatureView,
     CreationMode
 )
-import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import (
-    f1_score, precision_score, recall_score, accuracy_score, roc_auc_score
-)
+import numpy as np
 import pandas as pd
 
 # Set up basic logging
 logger = logging.getLogger("snowflake_ml_pipeline")
 
+# Above this many rows the Feature View is trained in the warehouse via
+# snowflake.ml.modeling instead of being pulled into pandas
+LOCAL_TRAINING_MAX_ROWS = 1_000_000
+
+# SQL templates for monitor setup, built once at import and filled per environment
+MONITOR_SOURCE_TEMPLATE = string.Template("""
+    CREATE OR REPLACE TABLE $source_table AS
+    SELECT
+        p.CUSTOMER_ID,
+        p."output_feature_0"::NUMBER AS PREDICTION,
+        c.TARGET_LABEL AS ACTUAL,
+        p.PREDICTION_TIMESTAMP AS TIMESTAMP
+    FROM $output_table p
+    JOIN $raw_table c ON p.CUSTOMER_ID = c.CUSTOMER_ID
+""")
+
+MONITOR_BASELINE_TEMPLATE = string.Template("""
+    CREATE OR REPLACE TABLE $baseline_table AS
+    SELECT
+        CUSTOMER_ID,
+        TARGET_LABEL AS ACTUAL,
+        0 AS PREDICTION,
+        CURRENT_TIMESTAMP()::TIMESTAMP_NTZ AS TIMESTAMP
+    FROM $raw_table
+    SAMPLE (80)
+""")
+
+MODEL_MONITOR_TEMPLATE = string.Template("""
+    CREATE OR REPLACE MODEL MONITOR $monitor_name
+    WITH
+        MODEL = $db.PIPELINES.$model_name
+        VERSION = $version_name
+        FUNCTION = predict
+        SOURCE = $source_table
+        BASELINE = $baseline_table
+        TIMESTAMP_COLUMN = TIMESTAMP
+        PREDICTION_CLASS_COLUMNS = (PREDICTION)
+        ACTUAL_CLASS_COLUMNS = (ACTUAL)
+        ID_COLUMNS = (CUSTOMER_ID)
+        WAREHOUSE = $warehouse
+        REFRESH_INTERVAL = '1 hour'
+        AGGREGATION_WINDOW = '1 day'
+""")
+
+
+# ============================================================================
+# Session Context
+# ============================================================================
+
+SessionContext = namedtuple("SessionContext", ["database", "schema", "warehouse"])
+
+
+def session_context(session: Session) -> SessionContext:
+    """
+    The session's current database, schema and warehouse (unquoted) from a
+    single query, instead of one get_current_*() round trip each.
+    """
+    row = session.sql("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA(), CURRENT_WAREHOUSE()").collect()[0]
+    return SessionContext(*(value.strip('"') if value else value for value in row))
+
+
+@functools.lru_cache(maxsize=32)
+def parse_fqn(fqn: str, default_database: str, default_schema: str) -> tuple:
+    """Splits DB.SCHEMA.NAME into its parts; a bare name gets the default database and schema."""
+    parts = fqn.split(".")
+    if len(parts) == 3:
+        return tuple(parts)
+    return default_database, default_schema, fqn
+
 
 # ============================================================================
 # Data Validation
@@ -54,28 +125,96 @@ def validate_data(pdf: pd.DataFrame, required_columns: list, label_column: str =
     if missing:
         raise ValueError(f"Missing required columns: {missing}. Available: {list(pdf.columns)}")
 
+    class_dist = None
+    if label_column and label_column in pdf.columns:
+        class_dist = pdf[label_column].value_counts(normalize=True).to_dict()
+    _check_training_size(len(pdf), class_dist, results)
+
+    logger.info(f"Data validation passed: {len(pdf)} rows, {len(pdf.columns)} columns")
+    return results
+
+
+def validate_snowpark_data(df, required_columns: list, label_column: str = None) -> dict:
+    """
+    The checks of validate_data for a Snowpark DataFrame, computed in the
+    warehouse from one grouped count instead of pulling the rows into pandas.
+    Null counts are skipped; Feature View columns are already coalesced to 0.
+
+    Returns a dict with validation results. Raises ValueError on critical failures.
+    """
+    missing = [c for c in required_columns if c not in df.columns]
+    if missing:
+        raise ValueError(f"Missing required columns: {missing}. Available: {df.columns}")
+
+    results = {"column_count": len(df.columns)}
+    class_dist = None
+    if label_column and label_column in df.columns:
+        class_counts = {row[0]: row[1] for row in df.group_by(label_column).count().collect()}
+        row_count = sum(class_counts.values())
+        class_dist = {label: count / row_count for label, count in class_counts.items()}
+    else:
+        row_count = df.count()
+    results["row_count"] = row_count
+    _check_training_size(row_count, class_dist, results)
+
+    logger.info(f"Data validation passed: {row_count} rows, {len(df.columns)} columns")
+    return results
+
+
+def _check_training_size(row_count: int, class_dist: Optional[dict], results: dict) -> None:
+    """Minimum row count and class balance checks shared by both validators."""
     # Check minimum row count
-    if len(pdf) < 50:
-        raise ValueError(f"Insufficient data: {len(pdf)} rows. Minimum 50 required for training.")
+    if row_count < 50:
+        raise ValueError(f"Insufficient data: {row_count} rows. Minimum 50 required for training.")
 
     # Check class balance if label column provided
-    if label_column and label_column in pdf.columns:
-        class_dist = pdf[label_column].value_counts(normalize=True)
-        results["class_distribution"] = class_dist.to_dict()
-        minority_pct = class_dist.min()
+    if class_dist is not None:
+        results["class_distribution"] = class_dist
+        minority_pct = min(class_dist.values())
         if minority_pct < 0.01:
             raise ValueError(f"Severe class imbalance: minority class is {minority_pct:.2%}")
-        logger.info(f"Class distribution: {class_dist.to_dict()}")
+        logger.info(f"Class distribution: {class_dist}")
 
-    logger.info(f"Data validation passed: {len(pdf)} rows, {len(pdf.columns)} columns")
-    return results
+
+# ============================================================================
+# Feature Store Helpers
+# ============================================================================
+
+def register_entity_if_missing(fs: FeatureStore, entity: Entity) -> bool:
+    """
+    Registers the entity only when it isn't already in the Feature Store.
+    Returns True if a registration was issued.
+    """
+    existing = {row["NAME"] for row in fs.list_entities().collect()}
+    if str(entity.name).strip('"').upper() in existing:
+        return False
+    fs.register_entity(entity)
+    return True
+
+
+def feature_definition_hash(df_features) -> str:
+    """Short SHA256 of the SQL that defines a Feature View."""
+    return hashlib.sha256(df_features.queries["queries"][-1].encode("utf-8")).hexdigest()[:16]
+
+
+def feature_view_is_current(fs: FeatureStore, fv_name: str, version: str, defn_hash: str) -> bool:
+    """
+    True when the registered Feature View was built from the same definition.
+    The definition hash is recorded in the Feature View description at registration.
+    """
+    try:
+        existing = fs.get_feature_view(name=fv_name, version=version)
+    except Exception:
+        return False
+    return defn_hash in (existing.desc or "")
 
 
 # ============================================================================
 # Pipeline Tasks
 # ============================================================================
 
-def feature_engineering_task(session: Session, source_table: str, target_fs_object: str) -> str:
+def feature_engineering_task(session: Session, source_table: str, target_fs_object: str,
+                             ctx: Optional[SessionContext] = None) -> str:
     """
     Step 1: Creates an Entity and Feature View in the Snowflake Feature Store.
 
@@ -85,26 +224,16 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
     """
     logger.info(f"Starting Feature Store engineering from {source_table}")
 
-    # Parse target location
-    try:
-        parts = target_fs_object.split('.')
-        if len(parts) == 3:
-            db_name, schema_name, fv_name = parts
-        else:
-            db_name = session.get_current_database()
-            schema_name = session.get_current_schema()
-            fv_name = target_fs_object
-    except Exception:
-        db_name = session.get_current_database()
-        schema_name = session.get_current_schema()
-        fv_name = target_fs_object
+    ctx = ctx or session_context(session)
+
+    db_name, schema_name, fv_name = parse_fqn(target_fs_object, ctx.database, ctx.schema)
 
     # Initialize Feature Store
     fs = FeatureStore(
         session=session,
         database=db_name,
         name=schema_name,
-        default_warehouse=session.get_current_warehouse(),
+        default_warehouse=ctx.warehouse,
         creation_mode=CreationMode.CREATE_IF_NOT_EXIST
     )
 
@@ -114,8 +243,10 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
         join_keys=["CUSTOMER_ID"],
         desc="Unique Customer Identifier"
     )
-    fs.register_entity(customer_entity)
-    logger.info("Entity CUSTOMER_ENTITY registered.")
+    if register_entity_if_missing(fs, customer_entity):
+        logger.info("Entity CUSTOMER_ENTITY registered.")
+    else:
+        logger.info("Entity CUSTOMER_ENTITY already registered.")
 
     # Read raw data and compute features
     df_raw = session.table(source_table)
@@ -140,13 +271,20 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
         F.col("TARGET_LABEL"),
     ).fillna(0)
 
+    # Skip re-registration when the definition is unchanged; the Dynamic Table
+    # keeps refreshing on its own schedule
+    defn_hash = feature_definition_hash(df_features)
+    if feature_view_is_current(fs, fv_name, "v1", defn_hash):
+        logger.info(f"Feature View {fv_name} (v1) definition unchanged; skipping registration")
+        return f"Success: Feature View {fv_name} (v1) unchanged in {db_name}.{schema_name}"
+
     # Create and register Feature View
     fv = FeatureView(
         name=fv_name,
         entities=[customer_entity],
         feature_df=df_features,
         refresh_freq="1 day",
-        desc="Customer features for churn prediction (with derived features)"
+        desc=f"Customer features for churn prediction (with derived features) [definition {defn_hash}]"
     )
 
     fs.register_feature_view(
@@ -158,97 +296,181 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
     return f"Success: Feature View {fv_name} (v1) registered in {db_name}.{schema_name}"
 
 
-def model_training_task(session: Session, feature_view_path: str, model_name: str, stage_location: str) -> str:
+def train_in_warehouse(df_train) -> tuple:
+    """
+    Trains the XGBoost classifier with snowflake.ml.modeling so the data never
+    leaves Snowflake. Used for Feature Views too large to pull into pandas.
+
+    Returns (model, metrics, sample_input) ready for Model Registry logging.
+    """
+    from snowflake.ml.modeling.xgboost import XGBClassifier as SnowflakeXGBClassifier
+    from snowflake.ml.modeling import metrics as sf_metrics
+
+    label_col = "TARGET_LABEL"
+    feature_cols = [c for c in df_train.columns if c != label_col]
+    train_df, test_df = df_train.random_split([0.8, 0.2], seed=42)
+
+    clf = SnowflakeXGBClassifier(
+        input_cols=feature_cols,
+        label_cols=[label_col],
+        # Same output column name as the pandas path, which monitor setup reads
+        output_cols=['"output_feature_0"'],
+        n_estimators=100,
+        max_depth=4,
+        learning_rate=0.1,
+        eval_metric="logloss",
+        random_state=42,
+    )
+    clf.fit(train_df)
+
+    # Probability columns are named <prefix><class>, so the prefix is set
+    # explicitly rather than relying on the generated PREDICT_PROBA_ default
+    proba_prefix = "CHURN_PROBA_"
+    scored = clf.predict_proba(clf.predict(test_df), output_cols_prefix=proba_prefix)
+    pred_col = '"output_feature_0"'
+    metrics = {
+        "accuracy": round(sf_metrics.accuracy_score(df=scored, y_true_col_names=label_col, y_pred_col_names=pred_col), 4),
+        "f1_score": round(sf_metrics.f1_score(df=scored, y_true_col_names=label_col, y_pred_col_names=pred_col), 4),
+        "precision": round(sf_metrics.precision_score(df=scored, y_true_col_names=label_col, y_pred_col_names=pred_col), 4),
+        "recall": round(sf_metrics.recall_score(df=scored, y_true_col_names=label_col, y_pred_col_names=pred_col), 4),
+        "auc_roc": round(sf_metrics.roc_auc_score(df=scored, y_true_col_names=label_col, y_score_col_names=f"{proba_prefix}1"), 4),
+        "train_samples": train_df.count(),
+        "test_samples": test_df.count(),
+        "n_features": len(feature_cols),
+    }
+
+    return clf, metrics, train_df.select(*feature_cols).limit(100)
+
+
+def model_training_task(session: Session, feature_view_path: str, model_name: str, stage_location: str,
+                        ctx: Optional[SessionContext] = None) -> str:
     """
     Step 2: Reads features from Feature Store, trains XGBoost, registers in Registry.
 
     - Loads features from the Feature View (Dynamic Table)
     - Validates data quality before training
-    - Trains an XGBoost classifier
+    - Trains an XGBoost classifier (in the warehouse when the data is large)
     - Registers the model in Snowflake Model Registry with metrics and tags
-    - Passes sample_input_data for automatic ML Lineage capture
+    - Passes an explicit predict signature, plus sample_input_data for ML Lineage capture
     """
     logger.info(f"Starting Model Training using features from {feature_view_path}")
+    ctx = ctx or session_context(session)
 
-    # Parse feature view path
-    parts = feature_view_path.split(".")
-    if len(parts) == 3:
-        db_name, schema_name, fv_name = parts
-    else:
-        db_name = session.get_current_database().strip('"')
-        schema_name = "FEATURES"
-        fv_name = feature_view_path
+    db_name, schema_name, fv_name = parse_fqn(feature_view_path, ctx.database, "FEATURES")
 
     # Load data from Feature Store
     fs = FeatureStore(
         session=session,
         database=db_name,
         name=schema_name,
-        default_warehouse=session.get_current_warehouse().strip('"'),
+        default_warehouse=ctx.warehouse,
         creation_mode=CreationMode.CREATE_IF_NOT_EXIST
     )
 
+    # Read the materialized Dynamic Table; feature_df would re-run the
+    # defining query against the raw table
     fv = fs.get_feature_view(name=fv_name, version="v1")
-    df_snow = fv.feature_df
-    pdf = df_snow.to_pandas()
-
-    logger.info(f"Loaded {len(pdf)} rows from feature view")
-
-    # Data validation
-    required = ["CUSTOMER_ID", "TARGET_LABEL"]
-    validate_data(pdf, required_columns=required, label_column="TARGET_LABEL")
-
-    # Prepare training data
-    drop_cols = [c for c in ["TARGET_LABEL", "CUSTOMER_ID", "TIMESTAMP"] if c in pdf.columns]
-    X = pdf.drop(columns=drop_cols).select_dtypes(include=["number"])
-    y = pdf["TARGET_LABEL"]
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    logger.info(f"Train: {len(X_train)}, Test: {len(X_test)}, Features: {len(X.columns)}")
-
-    # Train XGBoost
-    clf = xgb.XGBClassifier(
-        n_estimators=100,
-        max_depth=4,
-        learning_rate=0.1,
-        eval_metric="logloss",
-        random_state=42,
-    )
-    clf.fit(X_train, y_train)
-
-    # Evaluate
-    y_pred = clf.predict(X_test)
-    y_pred_proba = clf.predict_proba(X_test)[:, 1]
+    df_snow = session.table(fv.fully_qualified_name())
+
+    if "CUSTOMER_ID" not in df_snow.columns:
+        raise ValueError(f"Missing required columns: ['CUSTOMER_ID']. Available: {df_snow.columns}")
+
+    # Project server-side so identifiers never cross the wire; NULLs are already
+    # coalesced to 0 in the Feature View definition
+    train_cols = [c for c in df_snow.columns if c not in ("CUSTOMER_ID", "TIMESTAMP")]
+    df_train = df_snow.select(*train_cols)
+
+    row_count = df_train.count()
+    version_name = f"v_{datetime.now(timezone.utc):%Y%m%d_%H%M%S}"
+
+    if row_count > LOCAL_TRAINING_MAX_ROWS:
+        # Large data: train inside the warehouse, no to_pandas() transfer
+        logger.info(f"{row_count} rows exceeds {LOCAL_TRAINING_MAX_ROWS}; training in warehouse")
+        # Same data validation as the local path, computed in the warehouse
+        validate_snowpark_data(df_train, required_columns=["TARGET_LABEL"], label_column="TARGET_LABEL")
+        clf, metrics, sample_input = train_in_warehouse(df_train)
+        # snowflake.ml.modeling models carry their own signatures
+        log_kwargs = {}
+    else:
+        # Imported here so the other task procedures don't pay xgboost/sklearn
+        # import time on every cold start
+        import xgboost as xgb
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import (
+            f1_score, precision_score, recall_score, accuracy_score, roc_auc_score
+        )
+
+        pdf = df_train.to_pandas(statement_params={"QUERY_TAG": "train"})
+
+        logger.info(f"Loaded {len(pdf)} rows from feature view")
+
+        # Data validation
+        required = ["TARGET_LABEL"]
+        validate_data(pdf, required_columns=required, label_column="TARGET_LABEL")
+
+        # Prepare training data as plain arrays instead of a dropped-column DataFrame copy.
+        # XGBoost works in float32 internally, so convert once up front.
+        feature_cols = [
+            c for c in pdf.columns
+            if c != "TARGET_LABEL" and pd.api.types.is_numeric_dtype(pdf[c])
+        ]
+        X = pdf.loc[:, feature_cols].to_numpy(dtype=np.float32)
+        y = pdf["TARGET_LABEL"].to_numpy()
+
+        X_train, X_test, y_train, y_test, idx_train, _ = train_test_split(
+            X, y, np.arange(len(pdf)), test_size=0.2, random_state=42, stratify=y
+        )
+        logger.info(f"Train: {len(X_train)}, Test: {len(X_test)}, Features: {len(feature_cols)}")
+
+        # Train XGBoost
+        clf = xgb.XGBClassifier(
+            n_estimators=100,
+            max_depth=4,
+            learning_rate=0.1,
+            eval_metric="logloss",
+            random_state=42,
+            n_jobs=-1,
+        )
+        clf.fit(X_train, y_train)
+        # Keep column names on the booster so registry inference maps features by name
+        clf.get_booster().feature_names = feature_cols
+
+        # Evaluate
+        y_pred = clf.predict(X_test)
+        y_pred_proba = clf.predict_proba(X_test)[:, 1]
+
+        metrics = {
+            "accuracy": round(accuracy_score(y_test, y_pred), 4),
+            "f1_score": round(f1_score(y_test, y_pred), 4),
+            "precision": round(precision_score(y_test, y_pred), 4),
+            "recall": round(recall_score(y_test, y_pred), 4),
+            "auc_roc": round(roc_auc_score(y_test, y_pred_proba), 4),
+            "train_samples": len(X_train),
+            "test_samples": len(X_test),
+            "n_features": len(feature_cols),
+        }
+
+        # Build the signature explicitly from 5 rows so the registry skips its own
+        # dtype probing; the Snowpark sample is then only used for lineage capture
+        sample_pdf = pdf.loc[:, feature_cols].iloc[idx_train[:100]]
+        predict_sig = model_signature.infer_signature(sample_pdf.head(5), clf.predict(X_train[:5]))
+        sample_input = session.create_dataframe(sample_pdf)
+        log_kwargs = {"signatures": {"predict": predict_sig}}
 
-    metrics = {
-        "accuracy": round(accuracy_score(y_test, y_pred), 4),
-        "f1_score": round(f1_score(y_test, y_pred), 4),
-        "precision": round(precision_score(y_test, y_pred), 4),
-        "recall": round(recall_score(y_test, y_pred), 4),
-        "auc_roc": round(roc_auc_score(y_test, y_pred_proba), 4),
-        "train_samples": len(X_train),
-        "test_samples": len(X_test),
-        "n_features": len(X.columns),
-    }
     for k, v in metrics.items():
         logger.info(f"  {k}: {v}")
 
     # Register model in Snowflake Model Registry
     reg = Registry(session=session)
-    version_name = f"v_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
-
-    # Create Snowpark DataFrame for lineage capture
-    sample_input = session.create_dataframe(X_train.head(100))
 
     mv = reg.log_model(
         model=clf,
         model_name=model_name,
         version_name=version_name,
         conda_dependencies=["xgboost", "scikit-learn", "pandas"],
-        comment=f"XGBoost classifier trained at {datetime.utcnow().isoformat()}",
+        comment=f"XGBoost classifier trained at {datetime.now(timezone.utc).isoformat()}",
         sample_input_data=sample_input,
+        **log_kwargs,
     )
 
     # Log metrics
@@ -260,7 +482,8 @@ def model_training_task(session: Session, feature_view_path: str, model_name: st
     return f"Success: Model {model_name} version {version_name} trained and registered."
 
 
-def inference_task(session: Session, feature_table: str, model_name: str, output_table: str) -> str:
+def inference_task(session: Session, feature_table: str, model_name: str, output_table: str,
+                   ctx: Optional[SessionContext] = None) -> str:
     """
     Step 3: Loads model from registry, runs batch prediction.
 
@@ -269,27 +492,23 @@ def inference_task(session: Session, feature_table: str, model_name: str, output
     - Saves predictions with metadata to the output table
     """
     logger.info("Starting Batch Inference")
+    ctx = ctx or session_context(session)
 
-    # Parse feature view path
-    parts = feature_table.split(".")
-    if len(parts) == 3:
-        db_name, schema_name, fv_name = parts
-    else:
-        db_name = session.get_current_database().strip('"')
-        schema_name = "FEATURES"
-        fv_name = feature_table
+    db_name, schema_name, fv_name = parse_fqn(feature_table, ctx.database, "FEATURES")
 
     # Get features from Feature Store
     fs = FeatureStore(
         session=session,
         database=db_name,
         name=schema_name,
-        default_warehouse=session.get_current_warehouse().strip('"'),
+        default_warehouse=ctx.warehouse,
         creation_mode=CreationMode.CREATE_IF_NOT_EXIST
     )
 
+    # Read the materialized Dynamic Table; feature_df would re-run the
+    # defining query against the raw table
     fv = fs.get_feature_view(name=fv_name, version="v1")
-    df_features = fv.feature_df
+    df_features = session.table(fv.fully_qualified_name())
 
     # Get model from registry (latest version)
     reg = Registry(session=session)
@@ -312,7 +531,13 @@ def inference_task(session: Session, feature_table: str, model_name: str, output
         "MODEL_VERSION", F.lit(latest_version.version_name)
     )
 
-    result_df.write.mode("overwrite").save_as_table(output_table)
+    # Predictions are regenerated on every run, so skip Fail-safe storage with a transient table
+    result_df.write.save_as_table(
+        output_table,
+        mode="overwrite",
+        table_type="transient",
+        statement_params={"QUERY_TAG": "inference"},
+    )
 
     row_count = session.table(output_table).count()
     logger.info(f"Predictions saved to {output_table}: {row_count} rows")
@@ -320,7 +545,8 @@ def inference_task(session: Session, feature_table: str, model_name: str, output
     return f"Success: Inference ({row_count} rows) saved to {output_table}"
 
 
-def monitor_setup_task(session: Session, model_name: str, output_table: str, monitoring_schema: str) -> str:
+def monitor_setup_task(session: Session, model_name: str, output_table: str, monitoring_schema: str,
+                       ctx: Optional[SessionContext] = None) -> str:
     """
     Step 4: Creates or updates a Model Monitor for drift and performance tracking.
 
@@ -329,38 +555,25 @@ def monitor_setup_task(session: Session, model_name: str, output_table: str, mon
     - Creates a Model Monitor with drift and performance tracking
     """
     logger.info("Setting up Model Monitor")
+    ctx = ctx or session_context(session)
 
-    db = session.get_current_database().strip('"')
-    env_prefix = db.split("_")[0]
+    db = ctx.database
+    env_prefix = db.partition("_")[0]
 
     # Prepare monitoring source: join predictions with actual labels
     source_table = f"{db}.{monitoring_schema}.CHURN_MONITOR_SOURCE"
     raw_table = f"{env_prefix}_RAW_DB.PUBLIC.CUSTOMERS"
 
-    session.sql(f"""
-        CREATE OR REPLACE TABLE {source_table} AS
-        SELECT
-            p.CUSTOMER_ID,
-            p."output_feature_0"::NUMBER AS PREDICTION,
-            c.TARGET_LABEL AS ACTUAL,
-            p.PREDICTION_TIMESTAMP AS TIMESTAMP
-        FROM {output_table} p
-        JOIN {raw_table} c ON p.CUSTOMER_ID = c.CUSTOMER_ID
-    """).collect()
+    session.sql(MONITOR_SOURCE_TEMPLATE.substitute(
+        source_table=source_table, output_table=output_table, raw_table=raw_table
+    )).collect()
     logger.info(f"Monitoring source table created: {source_table}")
 
     # Create baseline table
     baseline_table = f"{db}.{monitoring_schema}.CHURN_MONITOR_BASELINE"
-    session.sql(f"""
-        CREATE OR REPLACE TABLE {baseline_table} AS
-        SELECT
-            CUSTOMER_ID,
-            TARGET_LABEL AS ACTUAL,
-            0 AS PREDICTION,
-            CURRENT_TIMESTAMP()::TIMESTAMP_NTZ AS TIMESTAMP
-        FROM {raw_table}
-        SAMPLE (80)
-    """).collect()
+    session.sql(MONITOR_BASELINE_TEMPLATE.substitute(
+        baseline_table=baseline_table, raw_table=raw_table
+    )).collect()
     logger.info(f"Baseline table created: {baseline_table}")
 
     # Get the latest model version
@@ -373,25 +586,18 @@ def monitor_setup_task(session: Session, model_name: str, output_table: str, mon
 
     # Create Model Monitor
     monitor_name = f"{db}.{monitoring_schema}.CHURN_MODEL_MONITOR"
-    warehouse = session.get_current_warehouse().strip('"')
+    warehouse = ctx.warehouse
 
     try:
-        session.sql(f"""
-            CREATE OR REPLACE MODEL MONITOR {monitor_name}
-            WITH
-                MODEL = {db}.PIPELINES.{model_name}
-                VERSION = {latest_version_name}
-                FUNCTION = predict
-                SOURCE = {source_table}
-                BASELINE = {baseline_table}
-                TIMESTAMP_COLUMN = TIMESTAMP
-                PREDICTION_CLASS_COLUMNS = (PREDICTION)
-                ACTUAL_CLASS_COLUMNS = (ACTUAL)
-                ID_COLUMNS = (CUSTOMER_ID)
-                WAREHOUSE = {warehouse}
-                REFRESH_INTERVAL = '1 hour'
-                AGGREGATION_WINDOW = '1 day'
-        """).collect()
+        session.sql(MODEL_MONITOR_TEMPLATE.substitute(
+            monitor_name=monitor_name,
+            db=db,
+            model_name=model_name,
+            version_name=latest_version_name,
+            source_table=source_table,
+            baseline_table=baseline_table,
+            warehouse=warehouse,
+        )).collect()
         logger.info(f"Model Monitor created: {monitor_name}")
         return f"Success: Model Monitor {monitor_name} created for version {latest_version_name}"
     except Exception as e:
@@ -403,30 +609,47 @@ def monitor_setup_task(session: Session, model_name: str, output_table: str, mon
 # Main Entry Points for Stored Procedures / ML Jobs
 # ============================================================================
 
+PipelineTables = namedtuple("PipelineTables", ["source_table", "feature_view", "model_name", "output_table"])
+
+
+@functools.lru_cache(maxsize=4)
+def _tables_for_database(db: str) -> PipelineTables:
+    """Table and model names for an environment's ML database, e.g. DEV_ML_DB."""
+    # Derive environment prefix from database name (e.g., DEV_ML_DB -> DEV)
+    env_prefix = db.partition("_")[0]
+    return PipelineTables(
+        source_table=f"{env_prefix}_RAW_DB.PUBLIC.CUSTOMERS",
+        feature_view=f"{db}.FEATURES.CUSTOMER_FEATURES",
+        model_name="CHURN_PREDICTION_MODEL",
+        output_table=f"{db}.OUTPUT.CHURN_PREDICTIONS",
+    )
+
+
+def _resolve_tables(ctx: SessionContext) -> PipelineTables:
+    """Table and model names for the session's environment, derived once per database."""
+    return _tables_for_database(ctx.database or "DEV_ML_DB")
+
+
 def main(session: Session) -> str:
     """
     Default main function - runs the full pipeline sequentially.
     Useful for ML Jobs mode where a single job runs everything.
     """
-    db = session.get_current_database().strip('"')
-    env_prefix = db.split("_")[0]
-
-    source_table = f"{env_prefix}_RAW_DB.PUBLIC.CUSTOMERS"
-    feature_view = f"{db}.FEATURES.CUSTOMER_FEATURES"
-    model_name = "CHURN_PREDICTION_MODEL"
-    output_table = f"{db}.OUTPUT.CHURN_PREDICTIONS"
+    # Resolved once and shared, so no task re-queries the session context
+    ctx = session_context(session)
+    source_table, feature_view, model_name, output_table = _resolve_tables(ctx)
     monitoring_schema = "MONITORING"
 
-    result1 = feature_engineering_task(session, source_table, feature_view)
+    result1 = feature_engineering_task(session, source_table, feature_view, ctx)
     logger.info(result1)
 
-    result2 = model_training_task(session, feature_view, model_name, "")
+    result2 = model_training_task(session, feature_view, model_name, "", ctx)
     logger.info(result2)
 
-    result3 = inference_task(session, feature_view, model_name, output_table)
+    result3 = inference_task(session, feature_view, model_name, output_table, ctx)
     logger.info(result3)
 
-    result4 = monitor_setup_task(session, model_name, output_table, monitoring_schema)
+    result4 = monitor_setup_task(session, model_name, output_table, monitoring_schema, ctx)
     logger.info(result4)
 
     return "Pipeline complete"
@@ -434,62 +657,27 @@ def main(session: Session) -> str:
 
 def feature_engineering_main(session: Session) -> str:
     """Entry point for Feature Engineering stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-
-    env_prefix = db.split("_")[0]
-    source_table = f"{env_prefix}_RAW_DB.PUBLIC.CUSTOMERS"
-    feature_view = f"{db}.FEATURES.CUSTOMER_FEATURES"
-
-    return feature_engineering_task(session, source_table, feature_view)
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    return feature_engineering_task(session, tables.source_table, tables.feature_view, ctx)
 
 
 def model_training_main(session: Session) -> str:
     """Entry point for Model Training stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-
-    feature_view = f"{db}.FEATURES.CUSTOMER_FEATURES"
-    model_name = "CHURN_PREDICTION_MODEL"
-
-    return model_training_task(session, feature_view, model_name, "")
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    return model_training_task(session, tables.feature_view, tables.model_name, "", ctx)
 
 
 def inference_main(session: Session) -> str:
     """Entry point for Inference stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-
-    feature_view = f"{db}.FEATURES.CUSTOMER_FEATURES"
-    model_name = "CHURN_PREDICTION_MODEL"
-    output_table = f"{db}.OUTPUT.CHURN_PREDICTIONS"
-
-    return inference_task(session, feature_view, model_name, output_table)
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    return inference_task(session, tables.feature_view, tables.model_name, tables.output_table, ctx)
 
 
 def monitor_setup_main(session: Session) -> str:
     """Entry point for Monitor Setup stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-
-    model_name = "CHURN_PREDICTION_MODEL"
-    output_table = f"{db}.OUTPUT.CHURN_PREDICTIONS"
-    monitoring_schema = "MONITORING"
-
-    return monitor_setup_task(session, model_name, output_table, monitoring_schema)
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    return monitor_setup_task(session, tables.model_name, tables.output_table, "MONITORING", ctx)
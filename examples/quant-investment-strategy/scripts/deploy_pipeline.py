@@ -12,40 +12,180 @@ Supports two execution modes:
 Pipeline Tasks:
 1. Feature Engineering - Calculate technical indicators
 2. Strategy Registration - Register the custom model
-3. Signal Generation - Generate trading signals
+3. Signal Generation - Generate trading signals (after 1 and 2, which run in parallel)
 
 Usage:
-    python deploy_pipeline.py <ENV_NAME> [--mode sprocs|mljobs]
+    python deploy_pipeline.py <ENV_NAME> [<ENV_NAME> ...] [--mode sprocs|mljobs] [--run [--wait]]
     
 Example:
     python deploy_pipeline.py DEV
     python deploy_pipeline.py DEV --mode mljobs
+    python deploy_pipeline.py DEV --run --wait
+    python deploy_pipeline.py DEV SIT UAT
 """
 
+import io
 import os
-import yaml
+import re
+import json
 import sys
+import time
+import atexit
+import hashlib
+import inspect
+import types
 import argparse
-from snowflake.snowpark import Session
-from snowflake.core import Root
-from snowflake.core.task.dagv1 import DAGOperation, DAG, DAGTask
-from snowflake.core.task import Cron
+import functools
+import importlib
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Optional
 
-# Add src to path
-sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+# Snowflake and YAML modules are imported where they're used, so argument
+# parsing and --help don't pay for their import time
+if TYPE_CHECKING:
+    from snowflake.snowpark import Session
 
+# Paths resolved once at import, relative to this script
+_HERE = os.path.dirname(os.path.abspath(__file__))
+_SRC_DIR = os.path.normpath(os.path.join(_HERE, '..', 'src'))
 
-def get_snowpark_session():
+# Add src to path (once, even if the module is imported again)
+if _SRC_DIR not in sys.path:
+    sys.path.append(_SRC_DIR)
+
+
+CONFIG_PATH = os.path.normpath(os.path.join(_HERE, '..', 'config', 'environments.yml'))
+STRATEGY_LOGIC_PATH = os.path.join(_SRC_DIR, 'strategy_logic.py')
+
+# Packages every task needs, shared with the DAG-level default
+PACKAGES_BASE = ("snowflake-snowpark-python", "pandas", "snowflake-ml-python")
+STRATEGY_PACKAGES = PACKAGES_BASE + ("numpy",)
+
+# Procedures run with the caller's rights, so tasks act as the deploying role
+SPROC_EXECUTE_AS = "caller"
+
+# One record per pipeline task; every task shares the same packages tuple
+PipelineTask = namedtuple("PipelineTask", ["name", "file", "func_name", "packages"])
+
+# Pipeline tasks
+TASKS_CONFIG = (
+    PipelineTask("TASK_CALCULATE_INDICATORS", STRATEGY_LOGIC_PATH, "feature_engineering_main", STRATEGY_PACKAGES),
+    PipelineTask("TASK_REGISTER_STRATEGY", STRATEGY_LOGIC_PATH, "strategy_registration_main", STRATEGY_PACKAGES),
+    PipelineTask("TASK_GENERATE_SIGNALS", STRATEGY_LOGIC_PATH, "signal_generation_main", STRATEGY_PACKAGES),
+)
+
+# DAG schedule as (cron expression, time zone): hourly for trading strategies
+DAG_SCHEDULE = ("0 * * * *", "UTC")
+
+# DAG topology as (upstream, downstream) task names. Strategy registration only
+# needs the feature view schema, not the latest indicator batch, so it runs
+# alongside indicator calculation: [Indicators, Strategy] >> Signals
+DAG_EDGES = (
+    ("TASK_CALCULATE_INDICATORS", "TASK_GENERATE_SIGNALS"),
+    ("TASK_REGISTER_STRATEGY", "TASK_GENERATE_SIGNALS"),
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _load_config_cached(config_path: str, mtime: float, size: int) -> dict:
     """
-    Creates a session using Key Pair authentication.
-    Handles PEM-encoded private keys from environment variables.
+    Parses environments.yml, going through a JSON sidecar so later processes
+    skip the YAML parse. Keyed on (path, mtime, size) so edits are picked up.
+    """
+    cache_path = config_path + ".cache.json"
+    try:
+        with open(cache_path, "r") as f:
+            cached = json.load(f)
+        if cached.get("mtime") == mtime and cached.get("size") == size:
+            return cached["config"]
+    except (OSError, ValueError, KeyError):
+        pass
+    
+    import yaml
+    
+    # libyaml-backed loader when PyYAML was built with it, pure Python otherwise
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with open(config_path, "r") as f:
+        config = yaml.load(f, Loader=loader)
+    
+    # Best effort: the cache is an optimization, a read-only checkout still works.
+    # Configs JSON can't reproduce exactly (dates, non-string keys) aren't cached,
+    # so a sidecar hit always returns what a fresh parse would.
+    try:
+        payload = json.dumps({"mtime": mtime, "size": size, "config": config})
+    except (TypeError, ValueError):
+        return config
+    if json.loads(payload)["config"] != config:
+        return config
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass
+    finally:
+        # Gone after a successful replace; removes a partial write otherwise
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+    return config
+
+
+def _load_env_config(config_path: str = CONFIG_PATH) -> dict:
+    """Returns the full parsed environments.yml, cached in-process and on disk."""
+    config_path = os.path.abspath(config_path)
+    stat = os.stat(config_path)
+    return _load_config_cached(config_path, stat.st_mtime, stat.st_size)
+
+
+@functools.lru_cache(maxsize=None)
+def _merged_env(env_name: str, config_path: str = CONFIG_PATH, mtime: float = 0.0) -> types.MappingProxyType:
     """
+    Merges the 'default' section under an environment's own settings, so
+    environment values win. Cached per (env, path, mtime) and returned as a
+    read-only mapping because the same object is shared between calls.
+    """
+    full_config = _load_env_config(config_path)
+    return types.MappingProxyType({**full_config['default'], **full_config[env_name]})
+
+
+def get_env_config(env_name: str, config_path: str = CONFIG_PATH) -> types.MappingProxyType:
+    """Returns the merged, read-only configuration for an environment."""
+    return _merged_env(env_name, config_path, os.path.getmtime(config_path))
+
+
+# Module-level session cache keyed by a hash of the connection parameters: one
+# authenticated session serves the whole deploy and any further deploy() calls
+# made from the same process with the same credentials (e.g. deploy_all in CI).
+_SESSIONS: dict = {}
+_SESSION_LOCK = threading.Lock()
+
+# DER key bytes keyed by the SHA256 of the PEM text, so the key is parsed
+# once per process without keeping the PEM itself as a cache key
+_PRIVATE_KEY_CACHE: dict = {}
+
+
+def _load_private_key_bytes(private_key_pem: str) -> bytes:
+    """
+    Returns the DER bytes Snowflake expects for a PEM-encoded private key.
+    Parsing (and newline normalization) only happens the first time a key is seen.
+    """
+    digest = hashlib.sha256(private_key_pem.encode('utf-8')).hexdigest()
+    if digest not in _PRIVATE_KEY_CACHE:
+        _PRIVATE_KEY_CACHE[digest] = _parse_private_key(private_key_pem)
+    return _PRIVATE_KEY_CACHE[digest]
+
+
+def _parse_private_key(private_key_pem: str) -> bytes:
+    """Parses a PEM-encoded private key into DER (PKCS8) bytes."""
     from cryptography.hazmat.primitives import serialization
     from cryptography.hazmat.backends import default_backend
     
-    # Load and parse the private key from PEM format
-    private_key_pem = os.environ["SNOWFLAKE_PRIVATE_KEY"]
-    
     # Handle potential escaped newlines from GitHub secrets
     if "\\n" in private_key_pem:
         private_key_pem = private_key_pem.replace("\\n", "\n")
@@ -58,30 +198,248 @@ def get_snowpark_session():
     )
     
     # Convert to DER format (bytes) which Snowflake expects
-    private_key_bytes = private_key.private_bytes(
+    return private_key.private_bytes(
         encoding=serialization.Encoding.DER,
         format=serialization.PrivateFormat.PKCS8,
         encryption_algorithm=serialization.NoEncryption()
     )
+
+
+def _is_connection_alive(session: "Session") -> bool:
+    """Cheap health check used before handing out the cached session."""
+    try:
+        session.sql("SELECT 1").collect()
+        return True
+    except Exception:
+        return False
+
+
+def get_snowpark_session():
+    """
+    Returns a session using Key Pair authentication.
+    Handles PEM-encoded private keys from environment variables.
     
+    Sessions are cached per connection parameters and reused while still
+    alive, so repeated calls don't pay a new auth + TLS handshake.
+    """
+    private_key_pem = os.environ["SNOWFLAKE_PRIVATE_KEY"]
     connection_params = {
         "account": os.environ["SNOWFLAKE_ACCOUNT"],
         "user": os.environ["SNOWFLAKE_USER"],
-        "private_key": private_key_bytes,
         "role": os.environ["SNOWFLAKE_ROLE"],
         "warehouse": os.environ["SNOWFLAKE_WAREHOUSE"],
         "database": os.environ["SNOWFLAKE_DATABASE"],
         "schema": os.environ["SNOWFLAKE_SCHEMA"]
     }
-    return Session.builder.configs(connection_params).create()
+    # The key's digest stands in for the key itself in the cache key
+    key_digest = hashlib.sha256(private_key_pem.encode('utf-8')).hexdigest()
+    cache_key = hashlib.sha256(
+        json.dumps({**connection_params, "private_key": key_digest}, sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    
+    with _SESSION_LOCK:
+        session = _SESSIONS.get(cache_key)
+        if session is not None and _is_connection_alive(session):
+            return session
+        
+        from snowflake.snowpark import Session
+        
+        connection_params["private_key"] = _load_private_key_bytes(private_key_pem)
+        session = Session.builder.configs(connection_params).create()
+        _SESSIONS[cache_key] = session
+        return session
 
 
-def get_mljob_submitter(file_path: str, compute_pool: str, stage: str, packages: list):
+def _close_cached_session():
+    """Closes every cached session when the process exits."""
+    with _SESSION_LOCK:
+        for session in _SESSIONS.values():
+            try:
+                session.close()
+            except Exception:
+                pass
+        _SESSIONS.clear()
+
+
+atexit.register(_close_cached_session)
+
+
+@contextmanager
+def snowflake_session():
     """
-    Returns a function that submits an ML Job when called.
-    ML Jobs run on Compute Pools (container-based) instead of Warehouses.
+    Yields the cached Snowpark session.
+    The session is not closed on exit; it is closed once when the process ends.
+    """
+    yield get_snowpark_session()
+
+
+def execute_batch(session: "Session", statements: list) -> list:
+    """
+    Sends independent SQL statements to Snowflake as one multi-statement request,
+    paying a single round trip instead of one per statement.
+    Returns the fetched rows of each statement, in order.
+    """
+    if not statements:
+        return []
+    batched_sql = ";\n".join(statements)
+    cursor = session.connection.cursor()
+    try:
+        cursor.execute(batched_sql, num_statements=len(statements))
+        # Drain every statement's result so errors in later statements surface here
+        results = [cursor.fetchall()]
+        while cursor.nextset():
+            results.append(cursor.fetchall())
+        return results
+    finally:
+        cursor.close()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_source(local_path: str) -> tuple:
+    """Reads a source file and its MD5 once per process (shared by every deploy)."""
+    with open(local_path, "rb") as f:
+        data = f.read()
+    return data, hashlib.md5(data).hexdigest()
+
+
+def upload_code_once(session: "Session", local_path: str, code_stage: str) -> str:
+    """
+    Uploads a source file to a content-addressed folder of the code stage
+    (<stage>/<sha256[:12]>/<file>) unless that folder already holds it.
+    The file name is kept so the module still imports under its own name, and
+    identical code is shared across tasks and deploys without comparing
+    checksums (LIST reports the MD5 of the encrypted object on internal stages).
+    Returns the staged path so procedures can reference it via imports.
+    """
+    file_name = os.path.basename(local_path)
+    data, _ = _read_source(local_path)
+    content_hash = hashlib.sha256(data).hexdigest()[:12]
+    staged_dir = f"{code_stage}/{content_hash}"
+    
+    staged_files = session.sql(f"LIST {staged_dir}/").collect()
+    if any(row["name"].endswith(f"/{content_hash}/{file_name}") for row in staged_files):
+        print(f"  ✅ {file_name} ({content_hash}) already on stage, skipping upload")
+    else:
+        session.file.put_stream(
+            io.BytesIO(data), f"{staged_dir}/{file_name}", auto_compress=False, overwrite=True
+        )
+        print(f"  ✅ Uploaded {file_name} to {staged_dir}")
+    return f"{staged_dir}/{file_name}"
+
+
+def remove_stale_code(session: "Session", code_stage: str, current_dir: str) -> None:
+    """
+    Removes every content-addressed folder of the code stage except
+    current_dir. Procedures are registered with their pickled handlers in the
+    folder of the code they import, so the current folder holds everything
+    the deployed procedures reference. Files outside hash folders are left alone.
+    """
+    current_hash = current_dir.rsplit("/", 1)[-1]
+    stale_hashes = set()
+    for row in session.sql(f"LIST {code_stage}/").collect():
+        # LIST names are <stage>/<folder>/<file>
+        parts = row["name"].split("/")
+        if len(parts) > 2 and re.fullmatch(r"[0-9a-f]{12}", parts[1]) and parts[1] != current_hash:
+            stale_hashes.add(parts[1])
+    if stale_hashes:
+        execute_batch(session, [f"REMOVE {code_stage}/{content_hash}/" for content_hash in sorted(stale_hashes)])
+        print(f"  ✅ Removed {len(stale_hashes)} stale code folder(s) from {code_stage}")
+
+
+def get_procedure_comments(session: "Session", db_name: str, schema_name: str) -> dict:
+    """Returns {procedure_name: comment} for the pipeline procedures in one SHOW query."""
+    rows = session.sql(f"SHOW PROCEDURES LIKE 'SP_%' IN SCHEMA {db_name}.{schema_name}").collect()
+    return {row["name"]: row["description"] for row in rows}
+
+
+def procedure_deploy_hash(code_md5: str, task: PipelineTask, stage_location: str) -> str:
+    """
+    Hash of everything that shapes a registered procedure: staged code, the
+    generated handler, its target function, packages and registration options.
+    """
+    key = "|".join([
+        code_md5, task.name, task.func_name, *task.packages,
+        inspect.getsource(make_sproc_handler), SPROC_EXECUTE_AS, stage_location,
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def pipeline_deploy_hash(code_md5: str, execution_mode: str, stage_location: str, warehouse: str,
+                         dag_config: Optional[dict] = None) -> str:
+    """
+    Hash of everything a DAG run depends on: code, task definitions, topology,
+    mode, warehouse, schedule and config.
+    """
+    key = "|".join([
+        code_md5,
+        execution_mode,
+        warehouse,
+        *DAG_SCHEDULE,
+        json.dumps(dag_config or {}, sort_keys=True),
+        *(procedure_deploy_hash(code_md5, task, stage_location) for task in TASKS_CONFIG),
+        *(f"{upstream}>>{downstream}" for upstream, downstream in DAG_EDGES),
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def get_task_comment(session: "Session", db_name: str, schema_name: str, task_name: str) -> Optional[str]:
+    """Returns the COMMENT of a task, or None if the task doesn't exist."""
+    rows = session.sql(f"SHOW TASKS LIKE '{task_name}' IN SCHEMA {db_name}.{schema_name}").collect()
+    return rows[0]["comment"] if rows else None
+
+
+def make_sproc_handler(module_name: str, func_name: str):
+    """
+    Returns a thin stored procedure handler that delegates to func_name in the
+    staged module, so registration doesn't re-upload the module for every task.
+    """
+    # Registration types the handler from its annotations
+    from snowflake.snowpark import Session
+    
+    def handler(session: Session) -> str:
+        # The sproc runtime reuses the interpreter across CALLs, so after the
+        # first call the module is already in sys.modules and the import is skipped
+        module = sys.modules.get(module_name) or importlib.import_module(module_name)
+        return getattr(module, func_name)(session)
+    
+    return handler
+
+
+def wait_for_task_run(session: "Session", db_name: str, root_task_name: str, started_at, timeout_s: int = 3600) -> str:
+    """
+    Polls COMPLETE_TASK_GRAPHS with exponential backoff until the graph run of
+    root_task_name scheduled after started_at finishes. Returns the final state.
+    The graph run ends as soon as any task fails, so a failed upstream task
+    doesn't leave the poll waiting on downstream tasks that never start.
+    """
+    # Values are bound rather than interpolated, so every poll sends identical text
+    history_sql = f"""
+        SELECT STATE FROM TABLE({db_name}.INFORMATION_SCHEMA.COMPLETE_TASK_GRAPHS(
+            ROOT_TASK_NAME => ?
+        ))
+        WHERE SCHEDULED_TIME >= ?::TIMESTAMP_LTZ
+        ORDER BY SCHEDULED_TIME DESC
+        LIMIT 1
+    """
+    delay = 2
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        # No row yet means the graph run is still queued or executing
+        rows = session.sql(history_sql, params=[root_task_name, started_at]).collect()
+        if rows:
+            return rows[0]["STATE"]
+        time.sleep(delay)
+        delay = min(delay * 2, 60)
+    return "TIMEOUT"
+
+
+@functools.lru_cache(maxsize=32)
+def _load_module(file_path: str, mtime: float):
+    """
+    Loads a task module from its file path once per (path, mtime); every task
+    that shares the file reuses the same module instead of re-executing its
+    top-level imports, while an edited file is picked up on the next call.
     """
-    from snowflake.ml.jobs import remote
     import importlib.util
     
     module_name = os.path.basename(file_path).replace('.py', '')
@@ -92,11 +450,23 @@ def get_mljob_submitter(file_path: str, compute_pool: str, stage: str, packages:
     task_module = importlib.util.module_from_spec(spec)
     sys.modules[module_name] = task_module
     spec.loader.exec_module(task_module)
+    return task_module
+
+
+def get_mljob_submitter(file_path: str, compute_pool: str, stage: str, packages: list):
+    """
+    Returns a function that submits an ML Job when called.
+    ML Jobs run on Compute Pools (container-based) instead of Warehouses.
+    """
+    from snowflake.ml.jobs import remote
+    from snowflake.snowpark import Session
     
-    if not hasattr(task_module, 'main') or not callable(task_module.main):
-        raise AttributeError(f"Module {file_path} must have a callable 'main' function for ML Jobs mode.")
+    file_path = os.path.abspath(file_path)
+    task_module = _load_module(file_path, os.path.getmtime(file_path))
     
-    main_function = task_module.main
+    main_function = getattr(task_module, 'main', None)
+    if not callable(main_function):
+        raise AttributeError(f"Module {file_path} must have a callable 'main' function for ML Jobs mode.")
     
     def sp_submit_remote_job(session: Session) -> str:
         decorated_fn = remote(
@@ -109,7 +479,8 @@ def get_mljob_submitter(file_path: str, compute_pool: str, stage: str, packages:
     return sp_submit_remote_job
 
 
-def deploy(env_name: str, execution_mode: str = "sprocs"):
+def deploy(env_name: str, execution_mode: str = "sprocs", threads: Optional[int] = None,
+           run: bool = False, wait: bool = False):
     """
     Deploy the investment strategy pipeline DAG to the specified environment.
     
@@ -121,17 +492,19 @@ def deploy(env_name: str, execution_mode: str = "sprocs"):
     Args:
         env_name: Target environment (DEV, SIT, UAT, PRD)
         execution_mode: 'sprocs' for Stored Procedures or 'mljobs' for ML Jobs
+        threads: Max concurrent sproc registrations (default: min(len(tasks), 4))
+        run: Trigger one run of the DAG after deploying, if it changed (non-PRD only)
+        wait: Block until the triggered run finishes
     """
     print(f"--- Deploying Investment Strategy Pipeline to Environment: {env_name} ---")
     print(f"Execution mode: {execution_mode.upper()}")
     
-    # Load configuration
-    config_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'environments.yml')
-    with open(config_path, "r") as f:
-        full_config = yaml.safe_load(f)
+    from snowflake.core import Root
+    from snowflake.core.task import Cron
+    from snowflake.core.task.dagv1 import DAGOperation, DAG, DAGTask
     
-    env_config = full_config[env_name].copy()
-    env_config.update(full_config['default']) 
+    # Load configuration
+    env_config = get_env_config(env_name)
     
     session = get_snowpark_session()
     api_root = Root(session)
@@ -146,66 +519,79 @@ def deploy(env_name: str, execution_mode: str = "sprocs"):
     print(f"Target: {db_name}.{schema_name}")
     print(f"Warehouse: {wh_name}")
     
-    # Define tasks configuration
-    src_dir = os.path.join(os.path.dirname(__file__), '..', 'src')
-    strategy_logic_path = os.path.join(src_dir, 'strategy_logic.py')
-    
-    tasks_config = [
-        {
-            "name": "TASK_CALCULATE_INDICATORS",
-            "file": strategy_logic_path,
-            "func_name": "feature_engineering_main",
-            "packages": ["snowflake-snowpark-python", "pandas", "numpy", "snowflake-ml-python"]
-        },
-        {
-            "name": "TASK_REGISTER_STRATEGY",
-            "file": strategy_logic_path,
-            "func_name": "strategy_registration_main",
-            "packages": ["snowflake-snowpark-python", "pandas", "numpy", "snowflake-ml-python"]
-        },
-        {
-            "name": "TASK_GENERATE_SIGNALS",
-            "file": strategy_logic_path,
-            "func_name": "signal_generation_main",
-            "packages": ["snowflake-snowpark-python", "pandas", "numpy", "snowflake-ml-python"]
-        }
-    ]
-    
-    # Common imports for all tasks
-    imports = [strategy_logic_path]
+    tasks_config = TASKS_CONFIG
     
     # Register stored procedures if using sprocs mode
     if execution_mode == "sprocs":
-        print("\nClearing old staged files to force fresh upload...")
-        try:
-            session.sql(f"REMOVE {code_stage}").collect()
-            print("  ✅ Stage cleared")
-        except Exception as e:
-            print(f"  ⚠️ Stage clear warning: {e}")
+        print("\nUploading pipeline code to stage...")
+        # Uploaded once and shared by every procedure via imports; the pickled
+        # handlers go into the same content-addressed folder
+        imports = [upload_code_once(session, STRATEGY_LOGIC_PATH, code_stage)]
+        staged_dir = imports[0].rsplit("/", 1)[0]
         
-        print("\nDropping existing procedures to force recreation...")
+        # Each procedure's COMMENT records the hash it was deployed from, so
+        # unchanged procedures skip the DROP + CREATE entirely
+        code_md5 = _read_source(STRATEGY_LOGIC_PATH)[1]
+        deploy_hashes = {task.name: procedure_deploy_hash(code_md5, task, staged_dir) for task in tasks_config}
+        existing_comments = get_procedure_comments(session, db_name, schema_name)
+        changed_tasks = []
         for task in tasks_config:
-            proc_name = f"{db_name}.{schema_name}.SP_{task['name']}"
+            if existing_comments.get(f"SP_{task.name}") == f"deploy_hash={deploy_hashes[task.name]}":
+                print(f"  ✅ SP_{task.name} unchanged, skipping")
+            else:
+                changed_tasks.append(task)
+        
+        if changed_tasks:
+            print("\nDropping changed procedures to force recreation...")
+            drop_statements = [
+                f"DROP PROCEDURE IF EXISTS {db_name}.{schema_name}.SP_{task.name}()"
+                for task in changed_tasks
+            ]
             try:
-                session.sql(f"DROP PROCEDURE IF EXISTS {proc_name}()").collect()
-                print(f"  ✅ Dropped: SP_{task['name']}")
+                execute_batch(session, drop_statements)
+                print(f"  ✅ Dropped {len(drop_statements)} procedures")
             except Exception as e:
-                print(f"  ⚠️ Drop warning for SP_{task['name']}: {e}")
+                print(f"  ⚠️ Drop warning: {e}")
         
         print("\nRegistering stored procedures...")
-        for task in tasks_config:
-            session.sproc.register_from_file(
-                file_path=task["file"],
-                func_name=task["func_name"],
-                name=f"{db_name}.{schema_name}.SP_{task['name']}",
+        def register_task(task):
+            # Registrations are independent CREATE PROCEDUREs, so they run concurrently
+            module_name = os.path.splitext(os.path.basename(task.file))[0]
+            session.sproc.register(
+                func=make_sproc_handler(module_name, task.func_name),
+                name=f"{db_name}.{schema_name}.SP_{task.name}",
                 is_permanent=True,
-                stage_location=code_stage,
-                packages=task["packages"],
+                stage_location=staged_dir,
+                packages=list(task.packages),
                 replace=True,
-                execute_as="caller",
-                imports=imports
+                execute_as=SPROC_EXECUTE_AS,
+                imports=imports,
+                comment=f"deploy_hash={deploy_hashes[task.name]}"
             )
-            print(f"  ✅ Registered: SP_{task['name']}")
+            return task.name
+        
+        if changed_tasks:
+            max_workers = threads or min(len(changed_tasks), 4)
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(register_task, task): task.name for task in changed_tasks}
+                failures = []
+                for future in as_completed(futures):
+                    try:
+                        print(f"  ✅ Registered: SP_{future.result()}")
+                    except Exception as e:
+                        print(f"  ❌ Registration failed for SP_{futures[future]}: {e}")
+                        failures.append(e)
+                if failures:
+                    raise failures[0]
+        else:
+            print("  All procedures up to date")
+    
+    # The root task's COMMENT records what the deployed DAG was built from, so
+    # --run only spends warehouse credits when something actually changed
+    # Read by the tasks at run time through SYSTEM$GET_TASK_GRAPH_CONFIG
+    dag_config = {"lookback_days": env_config.get('lookback_days', 90)}
+    pipeline_hash = pipeline_deploy_hash(_read_source(STRATEGY_LOGIC_PATH)[1], execution_mode, code_stage,
+                                         wh_name, dag_config)
     
     # Build and deploy DAG
     print("\nBuilding DAG...")
@@ -213,65 +599,97 @@ def deploy(env_name: str, execution_mode: str = "sprocs"):
     dag_op = DAGOperation(schema_obj)
     
     dag_name = "INVESTMENT_STRATEGY_PIPELINE"
+    previous_comment = get_task_comment(session, db_name, schema_name, dag_name)
     
     with DAG(
         dag_name,
         stage_location=code_stage,
-        schedule=Cron("0 * * * *", "UTC"),  # Hourly for trading strategies
+        schedule=Cron(*DAG_SCHEDULE),
         warehouse=wh_name,
-        packages=["snowflake-snowpark-python", "pandas", "numpy", "snowflake-ml-python"]
+        packages=list(STRATEGY_PACKAGES),
+        config=dag_config,
+        comment=f"deploy_hash={pipeline_hash}"
     ) as dag:
-        dag_tasks = []
-        
-        for task in tasks_config:
+        def task_definition(task):
             if execution_mode == "mljobs":
                 # ML Jobs mode: submit to compute pool
-                print(f"  Configuring ML Job for: {task['name']}")
-                definition = get_mljob_submitter(
-                    file_path=task["file"],
+                print(f"  Configuring ML Job for: {task.name}")
+                return get_mljob_submitter(
+                    file_path=task.file,
                     compute_pool=env_config.get('compute_pool', 'STRATEGY_COMPUTE_POOL'),
                     stage=code_stage,
-                    packages=task["packages"]
+                    packages=list(task.packages)
                 )
-            else:
-                # Stored Procedures mode: call the registered sproc
-                print(f"  Configuring stored procedure call for: {task['name']}")
-                definition = f"CALL {db_name}.{schema_name}.SP_{task['name']}()"
-            
-            dag_task = DAGTask(
-                task["name"],
-                definition=definition,
-                warehouse=wh_name
-            )
-            dag_tasks.append(dag_task)
+            # Stored Procedures mode: call the registered sproc
+            print(f"  Configuring stored procedure call for: {task.name}")
+            return f"CALL {db_name}.{schema_name}.SP_{task.name}()"
         
-        # Chain tasks: Indicators >> Strategy >> Signals
-        for i in range(len(dag_tasks) - 1):
-            dag_tasks[i] >> dag_tasks[i + 1]
+        dag_tasks = {
+            task.name: DAGTask(task.name, definition=task_definition(task), warehouse=wh_name)
+            for task in tasks_config
+        }
+        
+        for upstream, downstream in DAG_EDGES:
+            dag_tasks[upstream] >> dag_tasks[downstream]
     
     # Deploy the DAG
     print("\nDeploying DAG to Snowflake...")
     dag_op.deploy(dag, mode="orreplace")
     print(f"✅ DAG '{dag_name}' deployed successfully")
     
+    # Only after a successful deploy, so a failed one keeps the previous code
+    if execution_mode == "sprocs":
+        remove_stale_code(session, code_stage, staged_dir)
+    
     # Handle environment-specific behavior
     if env_name == 'PRD':
         print("Environment is PRD: Resuming DAG schedule (hourly)...")
-        session.sql(f"ALTER TASK {db_name}.{schema_name}.{dag_name}$TASK_CALCULATE_INDICATORS RESUME").collect()
+        # Resumes the root and every child task in one call; resuming only the
+        # root would leave the freshly deployed child tasks suspended
+        session.sql(f"SELECT SYSTEM$TASK_DEPENDENTS_ENABLE('{db_name}.{schema_name}.{dag_name}')").collect()
         print("✅ DAG schedule resumed")
     else:
         print(f"Environment is {env_name}: DAG created but suspended.")
-        print(f"To run manually: EXECUTE TASK {db_name}.{schema_name}.{dag_name}$TASK_CALCULATE_INDICATORS;")
+        root_task = f"{db_name}.{schema_name}.{dag_name}"
+        if run and previous_comment == f"deploy_hash={pipeline_hash}":
+            print(f"Pipeline unchanged since the last deploy, skipping run. To run anyway: EXECUTE TASK {root_task};")
+        elif run:
+            # EXECUTE TASK returns as soon as the run is queued
+            # Capturing the start time and queuing the run share one round trip
+            timestamp_rows, _ = execute_batch(session, ["SELECT CURRENT_TIMESTAMP()", f"EXECUTE TASK {root_task}"])
+            started_at = timestamp_rows[0][0]
+            print(f"✅ Triggered run of {root_task}")
+            if wait:
+                # Signals run last, after both branches of the DAG
+                state = wait_for_task_run(session, db_name, dag_name, started_at)
+                print(f"Run finished with state: {state}")
+        else:
+            print(f"To run manually: EXECUTE TASK {root_task};")
     
     print("\n✅ Investment Strategy Pipeline deployment complete!")
-    session.close()
+
+
+def deploy_all(env_names: list, execution_mode: str = "sprocs", threads: Optional[int] = None,
+               run: bool = False, wait: bool = False):
+    """
+    Deploys to several environments in sequence over one warm session, so
+    only the first environment pays the connection handshake.
+    """
+    for env_name in env_names:
+        deploy(env_name, execution_mode, threads, run=run, wait=wait)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Deploy Investment Strategy Pipeline to Snowflake")
-    parser.add_argument("env", help="Target environment (DEV, SIT, UAT, PRD)")
+    parser.add_argument("env", nargs="+", help="Target environment(s) (DEV, SIT, UAT, PRD), deployed in order")
     parser.add_argument("--mode", choices=["sprocs", "mljobs"], default="sprocs",
                         help="Execution mode: 'sprocs' for Stored Procedures (default) or 'mljobs' for ML Jobs")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="Max concurrent stored procedure registrations (default: min(tasks, 4))")
+    parser.add_argument("--run", action="store_true",
+                        help="Trigger one DAG run after deploying if the pipeline changed (non-PRD environments)")
+    parser.add_argument("--wait", action="store_true",
+                        help="With --run, block until the triggered run finishes")
     
     args = parser.parse_args()
-    deploy(args.env, args.mode)
+    deploy_all(args.env, args.mode, args.threads, run=args.run, wait=args.wait)
@@ -17,7 +17,13 @@ This pattern is common in:
 - Any rule-based decision system
 """
 
+import hashlib
+import inspect
 import logging
+import weakref
+import functools
+from collections import namedtuple
+from datetime import datetime, timezone
 import numpy as np
 import pandas as pd
 from typing import Dict, Any, List, Optional
@@ -33,10 +39,238 @@ from snowflake.ml.feature_store import (
     CreationMode
 )
 
+# Numba is optional: without it the signal rules run as NumPy array operations
+try:
+    from numba import njit as _numba_njit, prange
+    NUMBA_AVAILABLE = True
+    
+    def njit(*args, **kwargs):
+        """
+        numba.njit, retried without cache=True when no writable cache directory
+        is available (as in some sandboxes), so decorating never fails the import.
+        """
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return _numba_njit(args[0])
+        
+        def decorate(func):
+            try:
+                return _numba_njit(*args, **kwargs)(func)
+            except RuntimeError:
+                if not kwargs.get("cache"):
+                    raise
+                return _numba_njit(*args, **dict(kwargs, cache=False))(func)
+        return decorate
+except ImportError:
+    NUMBA_AVAILABLE = False
+    prange = range
+    
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit, usable bare or with options."""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+# Bottleneck is optional: its moving-window std is one C pass; a Numba loop or NumPy strided windows otherwise
+try:
+    import bottleneck as bn
+except ImportError:
+    bn = None
+
 # Set up logging
 logger = logging.getLogger("investment_strategy_pipeline")
 
 
+# =============================================================================
+# SIGNAL KERNELS - Columnar evaluation of the momentum rules
+# =============================================================================
+# Each asset's inputs are packed into a 6-bit state code; every rule outcome
+# is then a table lookup on that code instead of an if/elif chain per row.
+# The lookups return these per-asset codes:
+#   signal_code:  0 = HOLD, 1 = BUY, 2 = SELL
+#   rsi_state:    0 = neutral, 1 = oversold, 2 = overbought
+#   ma_pattern:   0 = bullish trend, 1 = bearish trend, 2 = short-term bullish, 3 = short-term bearish
+#   golden_cross: MA20 > MA50
+
+SIGNAL_LABELS = np.array(['HOLD', 'BUY', 'SELL'], dtype=object)
+RSI_LABELS = ("neutral", "oversold", "overbought")
+MA_LABELS = (
+    "Price > MA20 > MA50 (bullish trend)",
+    "Price < MA20 < MA50 (bearish trend)",
+    "Price > MA20 (short-term bullish)",
+    "Price < MA20 (short-term bearish)",
+)
+CROSS_LABELS = ("Death cross (MA20 < MA50)", "Golden cross (MA20 > MA50)")
+
+# Dictionary encoding of the low-cardinality reasoning text: everything after
+# the RSI value, indexed by [rsi_state, ma_pattern * 2 + golden_cross]
+REASONING_TAILS = np.array(
+    [
+        [f" ({rsi_label}); {ma_label}; {cross_label}" for ma_label in MA_LABELS for cross_label in CROSS_LABELS]
+        for rsi_label in RSI_LABELS
+    ],
+    dtype=object
+)
+
+# Preformatted RSI values for 0.0-100.0 in tenths, indexed by round(rsi * 10)
+RSI_TOKENS = np.array([f"RSI={tenths / 10:.1f}" for tenths in range(1001)], dtype=object)
+
+# Most assets are HOLD on any given bar, so they share one reasoning string
+HOLD_REASON = "HOLD: no strong signal"
+
+
+# Positions in the strategy parameter array
+PARAM_RSI_OVERSOLD = 0
+PARAM_RSI_OVERBOUGHT = 1
+PARAM_MA_SHORT_WINDOW = 2
+PARAM_MA_LONG_WINDOW = 3
+PARAM_POSITION_SIZE_PCT = 4
+
+# Default strategy parameters
+RSI_OVERSOLD_THRESHOLD = 30.0
+RSI_OVERBOUGHT_THRESHOLD = 70.0
+MA_SHORT_WINDOW = 20
+MA_LONG_WINDOW = 50
+POSITION_SIZE_PCT = 0.02  # 2% of portfolio per position
+
+DEFAULT_PARAMS = np.array(
+    [RSI_OVERSOLD_THRESHOLD, RSI_OVERBOUGHT_THRESHOLD, MA_SHORT_WINDOW, MA_LONG_WINDOW, POSITION_SIZE_PCT],
+    dtype=np.float64
+)
+DEFAULT_PARAMS.flags.writeable = False
+
+# State code bits
+RSI_OVERSOLD_BIT = 1 << 0
+RSI_OVERBOUGHT_BIT = 1 << 1
+PRICE_ABOVE_MA_SHORT_BIT = 1 << 2
+PRICE_BELOW_MA_SHORT_BIT = 1 << 3
+MA_SHORT_ABOVE_LONG_BIT = 1 << 4
+MA_SHORT_BELOW_LONG_BIT = 1 << 5
+STATE_CODES = 1 << 6
+
+
+def _evaluate_state(code: int) -> tuple:
+    """
+    Applies the momentum rules to one state code. This scalar reference is
+    only run at import, to fill the lookup tables below.
+    
+    Returns:
+        Tuple of (signal_code, strength, rsi_state, ma_pattern, golden_cross)
+    """
+    buy_score = 0.0
+    sell_score = 0.0
+    
+    # RSI Analysis
+    rsi_state = 0
+    if code & RSI_OVERSOLD_BIT:
+        buy_score += 0.4
+        rsi_state = 1
+    elif code & RSI_OVERBOUGHT_BIT:
+        sell_score += 0.4
+        rsi_state = 2
+    
+    # Moving Average Analysis
+    if code & PRICE_ABOVE_MA_SHORT_BIT and code & MA_SHORT_ABOVE_LONG_BIT:
+        buy_score += 0.3
+        ma_pattern = 0
+    elif code & PRICE_BELOW_MA_SHORT_BIT and code & MA_SHORT_BELOW_LONG_BIT:
+        sell_score += 0.3
+        ma_pattern = 1
+    elif code & PRICE_ABOVE_MA_SHORT_BIT:
+        buy_score += 0.15
+        ma_pattern = 2
+    else:
+        sell_score += 0.15
+        ma_pattern = 3
+    
+    # MA Crossover
+    golden_cross = bool(code & MA_SHORT_ABOVE_LONG_BIT)
+    if golden_cross:
+        buy_score += 0.2
+    else:
+        sell_score += 0.2
+    
+    # Determine signal
+    if buy_score > sell_score and buy_score >= 0.5:
+        signal_code = 1
+    elif sell_score > buy_score and sell_score >= 0.5:
+        signal_code = 2
+    else:
+        signal_code = 0
+    
+    return signal_code, max(buy_score, sell_score), rsi_state, ma_pattern, golden_cross
+
+
+_STATE_OUTCOMES = [_evaluate_state(code) for code in range(STATE_CODES)]
+SIGNAL_CODE_LUT = np.array([o[0] for o in _STATE_OUTCOMES], dtype=np.int8)
+STRENGTH_LUT = np.array([o[1] for o in _STATE_OUTCOMES], dtype=np.float64)
+RSI_STATE_LUT = np.array([o[2] for o in _STATE_OUTCOMES], dtype=np.int8)
+MA_PATTERN_LUT = np.array([o[3] for o in _STATE_OUTCOMES], dtype=np.int8)
+GOLDEN_CROSS_LUT = np.array([o[4] for o in _STATE_OUTCOMES], dtype=np.bool_)
+
+
+# Compiled on the first predict() call rather than at import, so procedures
+# that never score signals don't pay for it; later processes load it from the cache
+@njit(parallel=True, cache=True)
+def _state_kernel(rsi, ma_short, ma_long, current_price, params):
+    n = rsi.shape[0]
+    rsi_oversold = params[PARAM_RSI_OVERSOLD]
+    rsi_overbought = params[PARAM_RSI_OVERBOUGHT]
+    codes = np.empty(n, dtype=np.uint8)
+    for i in prange(n):
+        # Comparisons with NaN are False, leaving their bits clear
+        codes[i] = (
+            int(rsi[i] < rsi_oversold)
+            | int(rsi[i] > rsi_overbought) << 1
+            | int(current_price[i] > ma_short[i]) << 2
+            | int(current_price[i] < ma_short[i]) << 3
+            | int(ma_short[i] > ma_long[i]) << 4
+            | int(ma_short[i] < ma_long[i]) << 5
+        )
+    return codes
+
+
+def _state_arrays(rsi, ma_short, ma_long, current_price, params):
+    """NumPy version of _state_kernel, used when Numba isn't installed."""
+    rsi_oversold = params[PARAM_RSI_OVERSOLD]
+    rsi_overbought = params[PARAM_RSI_OVERBOUGHT]
+    bits = (
+        rsi < rsi_oversold,
+        rsi > rsi_overbought,
+        current_price > ma_short,
+        current_price < ma_short,
+        ma_short > ma_long,
+        ma_short < ma_long,
+    )
+    codes = np.zeros(rsi.shape[0], dtype=np.uint8)
+    for shift, bit in enumerate(bits):
+        codes |= bit.astype(np.uint8) << shift
+    return codes
+
+
+state_codes = _state_kernel if NUMBA_AVAILABLE else _state_arrays
+
+
+def score_signals(rsi, ma_short, ma_long, current_price, params) -> tuple:
+    """
+    Evaluates the momentum rules for every asset with one gather per output.
+    
+    Args:
+        rsi, ma_short, ma_long, current_price: Contiguous float64 arrays, one entry per asset
+        params: Contiguous float64 parameter array, indexed by the PARAM_* positions
+    
+    Returns:
+        Tuple of (signal_code, strength, rsi_state, ma_pattern, golden_cross) arrays
+    """
+    codes = state_codes(rsi, ma_short, ma_long, current_price, params)
+    return (
+        SIGNAL_CODE_LUT[codes],
+        STRENGTH_LUT[codes],
+        RSI_STATE_LUT[codes],
+        MA_PATTERN_LUT[codes],
+        GOLDEN_CROSS_LUT[codes],
+    )
+
+
 # =============================================================================
 # CUSTOM MODEL CLASS - This wraps our mathematical strategy for Model Registry
 # =============================================================================
@@ -61,12 +295,29 @@ class MomentumStrategy(custom_model.CustomModel):
         """Initialize the strategy with configurable parameters."""
         super().__init__(context)
         
-        # Strategy parameters (can be tuned and versioned)
-        self.rsi_oversold = 30
-        self.rsi_overbought = 70
-        self.ma_short_window = 20
-        self.ma_long_window = 50
-        self.position_size_pct = 0.02  # 2% of portfolio per position
+        # Strategy parameters (can be tuned and versioned), packed into one
+        # array so the kernels take them as a single argument; see PARAM_*
+        self._params = DEFAULT_PARAMS.copy()
+    
+    @property
+    def rsi_oversold(self) -> float:
+        return float(self._params[PARAM_RSI_OVERSOLD])
+    
+    @property
+    def rsi_overbought(self) -> float:
+        return float(self._params[PARAM_RSI_OVERBOUGHT])
+    
+    @property
+    def ma_short_window(self) -> int:
+        return int(self._params[PARAM_MA_SHORT_WINDOW])
+    
+    @property
+    def ma_long_window(self) -> int:
+        return int(self._params[PARAM_MA_LONG_WINDOW])
+    
+    @property
+    def position_size_pct(self) -> float:
+        return float(self._params[PARAM_POSITION_SIZE_PCT])
     
     @custom_model.inference_api
     def predict(self, input_df: pd.DataFrame) -> pd.DataFrame:
@@ -90,98 +341,402 @@ class MomentumStrategy(custom_model.CustomModel):
                 - SIGNAL: 'BUY', 'SELL', or 'HOLD'
                 - SIGNAL_STRENGTH: Numeric strength (0-1)
                 - POSITION_SIZE: Recommended position size
-                - REASONING: Explanation of the signal
+                - REASONING: Explanation of the signal (a shared note for HOLD)
         """
-        results = []
+        # Contiguous float64 views of the numeric columns (copied only when the
+        # incoming dtype or layout differs), so no value is boxed per row
+        rsi, ma_short, ma_long, current_price = (
+            np.ascontiguousarray(input_df[col].to_numpy(dtype=np.float64, copy=False))
+            for col in ('RSI_14', 'MA_20', 'MA_50', 'CURRENT_PRICE')
+        )
+        asset_ids = input_df['ASSET_ID'].to_numpy(copy=False)
         
-        for _, row in input_df.iterrows():
-            asset_id = row['ASSET_ID']
-            rsi = row['RSI_14']
-            ma_short = row['MA_20']
-            ma_long = row['MA_50']
-            current_price = row['CURRENT_PRICE']
-            
-            # Apply strategy rules
-            signal, strength, reasoning = self._evaluate_signal(
-                rsi, ma_short, ma_long, current_price
-            )
-            
-            # Calculate position size based on signal strength
-            position_size = self.position_size_pct * strength if signal == 'BUY' else 0.0
-            
-            results.append({
-                'ASSET_ID': asset_id,
-                'SIGNAL': signal,
-                'SIGNAL_STRENGTH': round(strength, 4),
-                'POSITION_SIZE': round(position_size, 4),
-                'REASONING': reasoning
-            })
+        # Apply strategy rules to whole columns at once
+        signal_code, strength, rsi_state, ma_pattern, golden_cross = score_signals(
+            rsi, ma_short, ma_long, current_price, self._params
+        )
         
-        return pd.DataFrame(results)
-    
-    def _evaluate_signal(
-        self, 
-        rsi: float, 
-        ma_short: float, 
-        ma_long: float, 
-        current_price: float
-    ) -> tuple:
+        # Calculate position size based on signal strength
+        position_size = np.where(signal_code == 1, self.position_size_pct * strength, 0.0)
+        
+        # Round both columns in one native pass each, reusing their buffers
+        # (both are fresh arrays: a table gather and an np.where result)
+        np.round(strength, 4, out=strength)
+        np.round(position_size, 4, out=position_size)
+        
+        # Reasoning is only spelled out for actionable (BUY/SELL) signals
+        reasoning = np.full(len(signal_code), HOLD_REASON, dtype=object)
+        active = np.flatnonzero(signal_code != 0)
+        active_rsi = rsi[active]
+        scaled = active_rsi * 10.0
+        tenths = np.rint(scaled)
+        # np.rint rounds the float product, but :.1f rounds the exact value, so
+        # they can disagree near a tie (1.15 is stored just below it and formats
+        # as 1.1). RSI_14 is DECIMAL(10,4), so ties are common; they and
+        # out-of-range values are formatted directly
+        use_token = (tenths >= 0) & (tenths <= 1000) & (np.abs(scaled - tenths) < 0.5 - 1e-6)  # False for NaN
+        tokens = np.empty(len(active), dtype=object)
+        tokens[use_token] = RSI_TOKENS[tenths[use_token].astype(np.intp)]
+        tokens[~use_token] = [f"RSI={value:.1f}" for value in active_rsi[~use_token]]
+        tails = REASONING_TAILS[rsi_state[active], ma_pattern[active] * 2 + golden_cross[active]]
+        reasoning[active] = tokens + tails
+        
+        # Columns are adopted as-is rather than copied into the frame. SIGNAL is
+        # gathered from SIGNAL_LABELS, so every row points at one of three
+        # shared strings; it stays object dtype because the registry's signature
+        # inference and UDF output conversion expect plain strings.
+        return pd.DataFrame({
+            'ASSET_ID': asset_ids,
+            'SIGNAL': SIGNAL_LABELS[signal_code],
+            'SIGNAL_STRENGTH': strength,
+            'POSITION_SIZE': position_size,
+            'REASONING': reasoning
+        }, copy=False)
+    
+    def signal_columns(self) -> list:
         """
-        Evaluate trading signal based on momentum rules.
+        The same momentum rules as Snowpark column expressions, so signals can be
+        computed inside Snowflake's SQL engine instead of a Python UDF.
+        CASE branches are taken in order, matching the if/elif chain above.
         
         Returns:
-            Tuple of (signal, strength, reasoning)
+            Columns ASSET_ID, SIGNAL, SIGNAL_STRENGTH, POSITION_SIZE, REASONING
         """
-        reasons = []
-        buy_score = 0
-        sell_score = 0
+        rsi = F.col("RSI_14")
+        ma_short = F.col("MA_20")
+        ma_long = F.col("MA_50")
+        current_price = F.col("CURRENT_PRICE")
         
-        # RSI Analysis
-        if rsi < self.rsi_oversold:
-            buy_score += 0.4
-            reasons.append(f"RSI={rsi:.1f} (oversold)")
-        elif rsi > self.rsi_overbought:
-            sell_score += 0.4
-            reasons.append(f"RSI={rsi:.1f} (overbought)")
-        else:
-            reasons.append(f"RSI={rsi:.1f} (neutral)")
+        oversold = rsi < self.rsi_oversold
+        overbought = rsi > self.rsi_overbought
+        bullish_trend = (current_price > ma_short) & (ma_short > ma_long)
+        bearish_trend = (current_price < ma_short) & (ma_short < ma_long)
+        short_bullish = current_price > ma_short
+        golden_cross = ma_short > ma_long
         
-        # Moving Average Analysis
-        if current_price > ma_short > ma_long:
-            buy_score += 0.3
-            reasons.append("Price > MA20 > MA50 (bullish trend)")
-        elif current_price < ma_short < ma_long:
-            sell_score += 0.3
-            reasons.append("Price < MA20 < MA50 (bearish trend)")
-        elif current_price > ma_short:
-            buy_score += 0.15
-            reasons.append("Price > MA20 (short-term bullish)")
-        else:
-            sell_score += 0.15
-            reasons.append("Price < MA20 (short-term bearish)")
+        # Float literals keep the arithmetic in FLOAT, as in predict()
+        buy_score = (
+            F.when(oversold, F.lit(0.4)).otherwise(F.lit(0.0))
+            + F.when(bullish_trend, F.lit(0.3)).when(bearish_trend, F.lit(0.0))
+               .when(short_bullish, F.lit(0.15)).otherwise(F.lit(0.0))
+            + F.when(golden_cross, F.lit(0.2)).otherwise(F.lit(0.0))
+        )
+        sell_score = (
+            F.when(oversold, F.lit(0.0)).when(overbought, F.lit(0.4)).otherwise(F.lit(0.0))
+            + F.when(bullish_trend, F.lit(0.0)).when(bearish_trend, F.lit(0.3))
+               .when(short_bullish, F.lit(0.0)).otherwise(F.lit(0.15))
+            + F.when(golden_cross, F.lit(0.0)).otherwise(F.lit(0.2))
+        )
         
-        # MA Crossover
-        if ma_short > ma_long:
-            buy_score += 0.2
-            reasons.append("Golden cross (MA20 > MA50)")
-        else:
-            sell_score += 0.2
-            reasons.append("Death cross (MA20 < MA50)")
+        signal = (
+            F.when((buy_score > sell_score) & (buy_score >= 0.5), F.lit("BUY"))
+            .when((sell_score > buy_score) & (sell_score >= 0.5), F.lit("SELL"))
+            .otherwise(F.lit("HOLD"))
+        )
+        strength = F.greatest(buy_score, sell_score)
+        position_size = F.when(signal == "BUY", strength * self.position_size_pct).otherwise(F.lit(0.0))
         
-        # Determine signal
-        if buy_score > sell_score and buy_score >= 0.5:
-            return 'BUY', buy_score, "; ".join(reasons)
-        elif sell_score > buy_score and sell_score >= 0.5:
-            return 'SELL', sell_score, "; ".join(reasons)
-        else:
-            return 'HOLD', max(buy_score, sell_score), "; ".join(reasons)
+        # The reasoning prints RSI like predict()'s f"{rsi:.1f}", which rounds the
+        # exact double half to even. RSI_14 is DECIMAL when it comes from the
+        # source table, so it's cast to FLOAT first, as the model's pandas input
+        # is. rsi * 10 is then formed exactly as p + err (x*8 and x*2 are exact,
+        # their sum goes through TwoSum), so a product that rounds onto a tie
+        # (1.15 * 10 == 11.5 in FLOAT) is still rounded by the exact value
+        rsi_float = rsi.cast(FloatType())
+        times_8, times_2 = rsi_float * 8.0, rsi_float * 2.0
+        product = times_8 + times_2
+        product_part = product - times_8
+        product_err = (times_8 - (product - product_part)) + (times_2 - product_part)
+        whole_tenths = F.floor(product)
+        fraction = product - whole_tenths
+        round_up = (fraction > 0.5) | ((fraction == 0.5) & (
+            (product_err > 0.0) | ((product_err == 0.0) & (whole_tenths - 2.0 * F.floor(whole_tenths / 2.0) == 1.0))
+        ))
+        rsi_tenths = whole_tenths + F.when(round_up, F.lit(1.0)).otherwise(F.lit(0.0))
+        
+        reasoning = F.when(signal == "HOLD", F.lit(HOLD_REASON)).otherwise(F.concat(
+            F.lit("RSI="),
+            F.to_char(rsi_tenths / 10.0, "FM999990.0"),
+            F.when(oversold, F.lit(" (oversold); "))
+             .when(overbought, F.lit(" (overbought); "))
+             .otherwise(F.lit(" (neutral); ")),
+            F.when(bullish_trend, F.lit("Price > MA20 > MA50 (bullish trend)"))
+             .when(bearish_trend, F.lit("Price < MA20 < MA50 (bearish trend)"))
+             .when(short_bullish, F.lit("Price > MA20 (short-term bullish)"))
+             .otherwise(F.lit("Price < MA20 (short-term bearish)")),
+            F.when(golden_cross, F.lit("; Golden cross (MA20 > MA50)"))
+             .otherwise(F.lit("; Death cross (MA20 < MA50)")),
+        ))
+        
+        return [
+            F.col("ASSET_ID"),
+            signal.alias("SIGNAL"),
+            F.round(strength, 4).alias("SIGNAL_STRENGTH"),
+            F.round(position_size, 4).alias("POSITION_SIZE"),
+            reasoning.alias("REASONING"),
+        ]
+
+
+# =============================================================================
+# FEATURE STORE HELPERS
+# =============================================================================
+
+PRICE_WINDOW = "PARTITION BY ASSET_ID ORDER BY DATE"
+
+# Days of feature rows kept per refresh. Overridden by the DAG's lookback_days config.
+DEFAULT_LOOKBACK_DAYS = 90
+
+# Extra calendar days of prices read before the lookback range so the longest
+# window (the 50-day MA) is full on its first row: 50 trading days plus the
+# LAG row span about 72 calendar days, with margin for market holidays
+WINDOW_WARMUP_DAYS = 80
+
+
+def trailing_window_sql(aggregate: str, expression: str, rows: int) -> str:
+    """
+    SQL for an aggregate over each asset's trailing `rows` prices.
+    NULL until the window holds `rows` non-null values, like pandas' rolling().
+    """
+    frame = f"OVER ({PRICE_WINDOW} ROWS BETWEEN {rows - 1} PRECEDING AND CURRENT ROW)"
+    return f"IFF(COUNT({expression}) {frame} = {rows}, {aggregate}({expression}) {frame}, NULL)"
+
+
+def wilder_sum_sql(expression: str, period: int) -> str:
+    """
+    SQL for Wilder's average of `expression` (as in calculate_rsi) up to each
+    row, scaled by period * decay^-PRICE_ROW with decay = (period - 1) / period.
+    The recursion avg = decay * prev_avg + current / period unrolls into a
+    running sum of decay^-row weighted values, the first `period` of which
+    share the seed's weight, so no recursive CTE is needed. Ratios of two such
+    sums are the ratio of the averages; the weights overflow FLOAT past about
+    9,500 rows per asset.
+    """
+    weight = f"POWER({(period - 1) / period!r}, -GREATEST(PRICE_ROW, {period}))"
+    return f"SUM({weight} * {expression}) OVER ({PRICE_WINDOW} ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)"
+
+
+_WILDER_GAIN_14 = wilder_sum_sql("GREATEST(PRICE_CHANGE, 0)", 14)
+_WILDER_LOSS_14 = wilder_sum_sql("GREATEST(-PRICE_CHANGE, 0)", 14)
+
+# Technical indicators as window functions over the PRICES CTE built in
+# feature_engineering_task, so they're computed inside the warehouse.
+# RSI is Wilder's, like calculate_rsi, seeded at the first price PRICES
+# reads; 100 * gain / (gain + loss) equals 100 - 100 / (1 + RS) and stays
+# defined when there are no losses.
+INDICATOR_SQL = {
+    "RSI_14": f"IFF(PRICE_ROW >= 14, 100 * {_WILDER_GAIN_14} / NULLIF({_WILDER_GAIN_14} + {_WILDER_LOSS_14}, 0), NULL)",
+    "MA_20": trailing_window_sql("AVG", "CLOSE_PRICE", 20),
+    "MA_50": trailing_window_sql("AVG", "CLOSE_PRICE", 50),
+    "VOLATILITY_20": f"{trailing_window_sql('STDDEV', 'DAILY_RETURN', 20)} * SQRT(252)",  # Annualized
+}
+
+# Optional feature columns and their neutral SQL defaults (e.g. before a full window)
+OPTIONAL_DEFAULTS = (
+    ("RSI_14", "50.0"),
+    ("MA_20", "CLOSE_PRICE"),
+    ("MA_50", "CLOSE_PRICE"),
+    ("VOLUME", "0"),
+    ("VOLATILITY_20", "0.0"),
+)
+
+
+def optional_column_sql(col_name: str, default: str, available: set) -> str:
+    """The source value when present, else the indicator computed from prices, else the default."""
+    candidates = [col_name] if col_name in available else []
+    if col_name in INDICATOR_SQL:
+        candidates.append(INDICATOR_SQL[col_name])
+    if not candidates:
+        return f"{default} AS {col_name}"
+    return f"COALESCE({', '.join(candidates + [default])}) AS {col_name}"
+
+
+def register_entity_if_missing(fs: FeatureStore, entity: Entity) -> bool:
+    """
+    Registers the entity only when it isn't already in the Feature Store.
+    Returns True if a registration was issued.
+    """
+    existing = {row["NAME"] for row in fs.list_entities().collect()}
+    if str(entity.name).strip('"').upper() in existing:
+        return False
+    fs.register_entity(entity)
+    return True
+
+
+def feature_definition_hash(df_features) -> str:
+    """Short SHA256 of the SQL that defines a Feature View."""
+    return hashlib.sha256(df_features.queries["queries"][-1].encode("utf-8")).hexdigest()[:16]
+
+
+def feature_view_is_current(fs: FeatureStore, fv_name: str, version: str, defn_hash: str) -> bool:
+    """
+    True when the registered Feature View was built from the same definition.
+    The definition hash is recorded in the Feature View description at registration.
+    """
+    try:
+        existing = fs.get_feature_view(name=fv_name, version=version)
+    except Exception:
+        return False
+    return defn_hash in (existing.desc or "")
+
+
+# =============================================================================
+# SESSION-SCOPED HANDLES
+# =============================================================================
+# The stored procedure runtime reuses the interpreter across CALLs, so caching
+# these handles per session lets warm runs skip the metadata round trips of
+# re-creating them. Sessions are keyed by id() and resolved through a weak map;
+# a cached handle keeps its session alive, so an id can't be reused while cached.
+
+_SESSIONS_BY_ID = weakref.WeakValueDictionary()
+
+# (database, schema) pairs whose Feature Store metadata this process has
+# already created or confirmed; later sessions open them without the probe
+_FEATURE_STORES_INITIALIZED = set()
+
+
+SessionContext = namedtuple("SessionContext", ["database", "schema", "warehouse"])
+
+
+def session_context(session: Session) -> SessionContext:
+    """
+    The session's current database, schema and warehouse (unquoted) from a
+    single query, instead of one get_current_*() round trip each.
+    """
+    row = session.sql("SELECT CURRENT_DATABASE(), CURRENT_SCHEMA(), CURRENT_WAREHOUSE()").collect()[0]
+    return SessionContext(*(value.strip('"') if value else value for value in row))
+
+
+@functools.lru_cache(maxsize=32)
+def parse_fqn(fqn: str, default_database: str, default_schema: str) -> tuple:
+    """
+    Splits DB.SCHEMA.NAME into its parts with quotes stripped; a bare name
+    gets the default database and schema.
+    """
+    parts = fqn.split('.')
+    if len(parts) == 3:
+        return tuple(p.strip('"') for p in parts)
+    return default_database, default_schema, fqn.strip('"')
+
+
+def _session_id(session: Session) -> int:
+    _SESSIONS_BY_ID[id(session)] = session
+    return id(session)
+
+
+@functools.lru_cache(maxsize=16)
+def _feature_store(session_id: int, database: str, name: str, warehouse: str) -> FeatureStore:
+    # Use CREATE_IF_NOT_EXIST to create Feature Store metadata if not present,
+    # the first time only
+    initialized = (database, name) in _FEATURE_STORES_INITIALIZED
+    fs = FeatureStore(
+        session=_SESSIONS_BY_ID[session_id],
+        database=database,
+        name=name,
+        default_warehouse=warehouse,
+        creation_mode=CreationMode.FAIL_IF_NOT_EXIST if initialized else CreationMode.CREATE_IF_NOT_EXIST
+    )
+    _FEATURE_STORES_INITIALIZED.add((database, name))
+    return fs
+
+
+@functools.lru_cache(maxsize=16)
+def _registry(session_id: int) -> Registry:
+    return Registry(session=_SESSIONS_BY_ID[session_id])
+
+
+@functools.lru_cache(maxsize=16)
+def _model_ref(session_id: int, model_name: str):
+    return _registry(session_id).get_model(model_name)
+
+
+def get_feature_store(session: Session, database: str, name: str, warehouse: str) -> FeatureStore:
+    """Returns the Feature Store handle for (session, database, schema, warehouse)."""
+    return _feature_store(_session_id(session), database, name, warehouse)
+
+
+def get_registry(session: Session) -> Registry:
+    """Returns the Model Registry handle for the session."""
+    return _registry(_session_id(session))
+
+
+def get_model_ref(session: Session, model_name: str):
+    """
+    Returns the registry handle of a model. Missing models raise and are not
+    cached; versions and the default are still queried fresh on every call.
+    """
+    return _model_ref(_session_id(session), model_name)
+
+
+# =============================================================================
+# MODEL REGISTRY HELPERS
+# =============================================================================
+
+def strategy_code_hash() -> Optional[str]:
+    """
+    Short SHA256 of the MomentumStrategy source, the signal kernels it
+    calls and its default parameters, or None when the source isn't
+    available (e.g. the module was loaded from bytecode only).
+    """
+    try:
+        # Numba dispatchers keep the original function on .py_func
+        source = "".join(
+            inspect.getsource(getattr(obj, "py_func", obj))
+            for obj in (MomentumStrategy, _evaluate_state, _state_kernel, _state_arrays, score_signals)
+        ) + repr([
+            # Module constants that predict() reads are part of the strategy too;
+            # arrays go through tolist() since their repr elides long contents
+            DEFAULT_PARAMS.tolist(), SIGNAL_LABELS.tolist(), RSI_LABELS, MA_LABELS, CROSS_LABELS,
+            REASONING_TAILS.tolist(), RSI_TOKENS.tolist(), HOLD_REASON,
+        ])
+    except (OSError, TypeError):
+        return None
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()[:16]
+
+
+def strategy_version_is_current(session: Session, model_name: str, code_hash: Optional[str]) -> Optional[str]:
+    """
+    Returns the name of a registered version built from the same strategy code,
+    or None. The code hash is recorded in the version comment at registration.
+    """
+    if code_hash is None:
+        return None
+    try:
+        versions = get_model_ref(session, model_name).versions()
+    except Exception:
+        return None
+    for mv in versions:
+        if f"[code {code_hash}]" in (mv.comment or ""):
+            return mv.version_name
+    return None
+
+
+def default_strategy_version(session: Session, model_name: str):
+    """
+    Returns the model's default version (set at each registration) from a
+    single metadata lookup, or None when the strategy isn't registered yet.
+    """
+    try:
+        model = get_model_ref(session, model_name)
+    except Exception:
+        return None
+    try:
+        return model.default
+    except Exception:
+        # No default recorded: take the newest version
+        versions = model.show_versions()
+        if versions.empty:
+            return None
+        latest = versions.sort_values("created_on", ascending=False).iloc[0]["name"]
+        return model.version(latest)
 
 
 # =============================================================================
 # PIPELINE TASKS - Feature Engineering, Strategy Registration, Signal Generation
 # =============================================================================
 
-def feature_engineering_task(session: Session, source_table: str, target_fs_object: str) -> str:
+def feature_engineering_task(session: Session, source_table: str, target_fs_object: str,
+                             ctx: Optional[SessionContext] = None,
+                             lookback_days: Optional[int] = DEFAULT_LOOKBACK_DAYS) -> str:
     """
     Task 1: Calculate technical indicators and register as Feature View.
     
@@ -194,38 +749,25 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
         session: Snowpark Session
         source_table: Input table with price data (ASSET_ID, DATE, CLOSE_PRICE)
         target_fs_object: Feature View name (e.g., DB.SCHEMA.ASSET_FEATURES)
+        ctx: Current database/schema/warehouse, resolved from the session if omitted
+        lookback_days: The Feature View keeps the last this many days of rows and
+            reads only WINDOW_WARMUP_DAYS more of prices, so the scan prunes older
+            micro-partitions while every window stays full (None reads all history)
     
     Returns:
         Success message
     """
     logger.info(f"Starting technical indicator calculation from {source_table}")
     
-    # Parse target location - strip quotes from all values
-    try:
-        parts = target_fs_object.split('.')
-        if len(parts) == 3:
-            db_name, schema_name, fv_name = [p.strip('"') for p in parts]
-        else:
-            db_name = session.get_current_database().strip('"')
-            schema_name = session.get_current_schema().strip('"')
-            fv_name = target_fs_object.strip('"')
-    except Exception:
-        db_name = session.get_current_database().strip('"')
-        schema_name = session.get_current_schema().strip('"')
-        fv_name = target_fs_object.strip('"')
+    ctx = ctx or session_context(session)
     
-    warehouse = session.get_current_warehouse().strip('"')
+    db_name, schema_name, fv_name = parse_fqn(target_fs_object, ctx.database, ctx.schema)
+    
+    warehouse = ctx.warehouse
     logger.info(f"Using database={db_name}, schema={schema_name}, warehouse={warehouse}")
     
-    # Initialize Feature Store
-    # Use CREATE_IF_NOT_EXIST to create Feature Store metadata if not present
-    fs = FeatureStore(
-        session=session,
-        database=db_name,
-        name=schema_name,
-        default_warehouse=warehouse,
-        creation_mode=CreationMode.CREATE_IF_NOT_EXIST
-    )
+    # Initialize Feature Store (creates its metadata if not present)
+    fs = get_feature_store(session, db_name, schema_name, warehouse)
     
     # Define Entity (ASSET_ID is the primary key)
     entity_name = "ASSET_ENTITY"
@@ -234,8 +776,10 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
         join_keys=["ASSET_ID"],
         desc="Unique Asset/Security Identifier"
     )
-    fs.register_entity(asset_entity)
-    logger.info(f"Entity {entity_name} registered.")
+    if register_entity_if_missing(fs, asset_entity):
+        logger.info(f"Entity {entity_name} registered.")
+    else:
+        logger.info(f"Entity {entity_name} already registered.")
     
     # Read raw price data
     logger.info(f"Reading source table: {source_table}")
@@ -246,42 +790,37 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
     
     # Build feature DataFrame - only select columns that exist
     # Use uppercase column names (Snowflake default)
-    available_cols = [c.upper() for c in df_raw.columns]
+    available_cols = {c.upper() for c in df_raw.columns}
     
-    # Start with required columns
-    select_cols = [
-        F.col("ASSET_ID"),
-        F.col("DATE"),
-        F.col("CLOSE_PRICE").alias("CURRENT_PRICE")
+    # Required columns, then the optional ones with their fallbacks
+    select_exprs = ["ASSET_ID", "DATE", "CLOSE_PRICE AS CURRENT_PRICE"] + [
+        optional_column_sql(col_name, default, available_cols) for col_name, default in OPTIONAL_DEFAULTS
     ]
     
-    # Add optional columns with defaults if they don't exist
-    if "RSI_14" in available_cols:
-        select_cols.append(F.coalesce(F.col("RSI_14"), F.lit(50.0)).alias("RSI_14"))
-    else:
-        select_cols.append(F.lit(50.0).alias("RSI_14"))
-        
-    if "MA_20" in available_cols:
-        select_cols.append(F.coalesce(F.col("MA_20"), F.col("CLOSE_PRICE")).alias("MA_20"))
-    else:
-        select_cols.append(F.col("CLOSE_PRICE").alias("MA_20"))
-        
-    if "MA_50" in available_cols:
-        select_cols.append(F.coalesce(F.col("MA_50"), F.col("CLOSE_PRICE")).alias("MA_50"))
-    else:
-        select_cols.append(F.col("CLOSE_PRICE").alias("MA_50"))
-        
-    if "VOLUME" in available_cols:
-        select_cols.append(F.coalesce(F.col("VOLUME"), F.lit(0)).alias("VOLUME"))
-    else:
-        select_cols.append(F.lit(0).alias("VOLUME"))
-        
-    if "VOLATILITY_20" in available_cols:
-        select_cols.append(F.coalesce(F.col("VOLATILITY_20"), F.lit(0.0)).alias("VOLATILITY_20"))
+    # Bounded backfill: the inner filter prunes the scan but also truncates the
+    # windows, so it reaches back a warm-up period further than the rows kept
+    if lookback_days is None:
+        prices_since = recent_only = ""
     else:
-        select_cols.append(F.lit(0.0).alias("VOLATILITY_20"))
+        prices_since = f"WHERE DATE >= DATEADD(day, -{int(lookback_days) + WINDOW_WARMUP_DAYS}, CURRENT_DATE()) "
+        recent_only = f" WHERE DATE >= DATEADD(day, -{int(lookback_days)}, CURRENT_DATE())"
+    
+    df_features = session.sql(
+        f"WITH PRICES AS ("
+        f"SELECT *, "
+        f"ROW_NUMBER() OVER ({PRICE_WINDOW}) - 1 AS PRICE_ROW, "
+        f"CLOSE_PRICE - LAG(CLOSE_PRICE) OVER ({PRICE_WINDOW}) AS PRICE_CHANGE, "
+        f"CLOSE_PRICE / LAG(CLOSE_PRICE) OVER ({PRICE_WINDOW}) - 1 AS DAILY_RETURN "
+        f"FROM {source_table} {prices_since}) "
+        f"SELECT * FROM (SELECT {', '.join(select_exprs)} FROM PRICES){recent_only}"
+    )
     
-    df_features = df_raw.select(*select_cols)
+    # Skip re-registration when the definition is unchanged; the Dynamic Table
+    # keeps refreshing on its own schedule
+    defn_hash = feature_definition_hash(df_features)
+    if feature_view_is_current(fs, fv_name, "v1", defn_hash):
+        logger.info(f"Feature View {fv_name} (v1) definition unchanged; skipping registration")
+        return f"Success: Feature View {fv_name} (v1) with technical indicators unchanged"
     
     # Create Feature View
     fv = FeatureView(
@@ -289,7 +828,7 @@ def feature_engineering_task(session: Session, source_table: str, target_fs_obje
         entities=[asset_entity],
         feature_df=df_features,
         refresh_freq="1 hour",  # More frequent for trading strategies
-        desc="Technical indicators for investment strategy"
+        desc=f"Technical indicators for investment strategy [definition {defn_hash}]"
     )
     
     # Register Feature View
@@ -314,7 +853,8 @@ def strategy_registration_task(session: Session, feature_view_path: str, model_n
     
     Args:
         session: Snowpark Session
-        feature_view_path: Path to feature data (DB.SCHEMA.FV_NAME format)
+        feature_view_path: Path to feature data (DB.SCHEMA.FV_NAME format). Its
+            columns are fixed by feature_engineering_task, so it isn't queried.
         model_name: Name for the strategy in registry
         stage_location: Stage for model artifacts
     
@@ -323,36 +863,25 @@ def strategy_registration_task(session: Session, feature_view_path: str, model_n
     """
     logger.info(f"Registering investment strategy as custom model: {model_name}")
     
-    # Parse feature view path
-    parts = feature_view_path.split('.')
-    if len(parts) == 3:
-        db_name, schema_name, fv_name = [p.strip('"') for p in parts]
-    else:
-        db_name = session.get_current_database().strip('"')
-        schema_name = "FEATURES"
-        fv_name = feature_view_path.strip('"')
-    
-    warehouse = session.get_current_warehouse().strip('"')
-    
-    # Get sample data from Feature Store
-    fs = FeatureStore(
-        session=session,
-        database=db_name,
-        name=schema_name,
-        default_warehouse=warehouse,
-        creation_mode=CreationMode.CREATE_IF_NOT_EXIST
-    )
-    
-    # Get feature view and sample data
-    fv = fs.get_feature_view(name=fv_name, version="v1")
-    df_sample = fv.feature_df.limit(10)
-    sample_pdf = df_sample.to_pandas()
-    
-    # Ensure required columns exist
-    required_cols = ['ASSET_ID', 'RSI_14', 'MA_20', 'MA_50', 'CURRENT_PRICE']
-    for col in required_cols:
-        if col not in sample_pdf.columns:
-            raise ValueError(f"Required column {col} missing from feature data")
+    # The strategy is rule-based and rarely changes, so skip re-registering
+    # when a version built from the same source already exists
+    code_hash = strategy_code_hash()
+    current_version = strategy_version_is_current(session, model_name, code_hash)
+    if current_version:
+        # A revert can match an older version, so point the default back at it
+        get_model_ref(session, model_name).default = current_version
+        logger.info(f"Strategy {model_name} unchanged (version {current_version}), skipping registration")
+        return f"Skipped: Strategy {model_name} unchanged (version {current_version})"
+    
+    # The signature only needs column names and dtypes, which match the
+    # Feature View's, so a representative in-memory row stands in for it
+    sample_pdf = pd.DataFrame({
+        'ASSET_ID': ['AAPL'],
+        'RSI_14': [50.0],
+        'MA_20': [100.0],
+        'MA_50': [100.0],
+        'CURRENT_PRICE': [100.0],
+    })
     
     # Create model context (can include configuration parameters)
     model_context = custom_model.ModelContext()
@@ -360,29 +889,31 @@ def strategy_registration_task(session: Session, feature_view_path: str, model_n
     # Instantiate our custom strategy model
     strategy = MomentumStrategy(model_context)
     
-    # Register in Model Registry
-    reg = Registry(session=session)
-    
-    # Generate timestamp-based version name to avoid conflicts
-    from datetime import datetime
-    version_name = f"v_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
+    # Generate timestamp-based version name to avoid conflicts; the comment
+    # records the same instant
+    registered_at = datetime.now(timezone.utc)
+    version_name = f"v_{registered_at:%Y%m%d_%H%M%S}"
     
     # Log the custom model
-    mv = reg.log_model(
+    mv = get_registry(session).log_model(
         model=strategy,
         model_name=model_name,
         version_name=version_name,
-        conda_dependencies=["pandas", "numpy"],
-        comment=f"Momentum-based investment strategy at {datetime.utcnow().isoformat()}",
-        sample_input_data=sample_pdf[required_cols].head()
+        conda_dependencies=["pandas", "numpy", "numba"],
+        comment=f"Momentum-based investment strategy at {registered_at.isoformat()} [code {code_hash}]",
+        sample_input_data=sample_pdf
     )
     
+    # Signal generation reads the default version rather than listing versions
+    get_model_ref(session, model_name).default = version_name
+    
     logger.info(f"Strategy {model_name} version {version_name} registered successfully")
     
     return f"Success: Strategy {model_name} version {version_name} registered"
 
 
-def signal_generation_task(session: Session, feature_table: str, model_name: str, output_table: str) -> str:
+def signal_generation_task(session: Session, feature_table: str, model_name: str, output_table: str,
+                           pushdown: bool = True, ctx: Optional[SessionContext] = None) -> str:
     """
     Task 3: Generate trading signals using the registered strategy.
     
@@ -394,59 +925,70 @@ def signal_generation_task(session: Session, feature_table: str, model_name: str
         feature_table: Path to Feature View (DB.SCHEMA.FV_NAME format)
         model_name: Name of the strategy in registry
         output_table: Output table for trading signals
+        pushdown: Evaluate the rules as SQL expressions (default) instead of
+            running the registered model's predict() as a Python UDF. The
+            registered version is still recorded as STRATEGY_VERSION.
+        ctx: Current database/schema/warehouse, resolved from the session if omitted
     
     Returns:
         Success message
     """
     logger.info(f"Generating trading signals using strategy {model_name}")
     
-    # Parse feature view path
-    parts = feature_table.split('.')
-    if len(parts) == 3:
-        db_name, schema_name, fv_name = [p.strip('"') for p in parts]
-    else:
-        db_name = session.get_current_database().strip('"')
-        schema_name = "FEATURES"
-        fv_name = feature_table.strip('"')
+    ctx = ctx or session_context(session)
     
-    warehouse = session.get_current_warehouse().strip('"')
+    db_name, schema_name, fv_name = parse_fqn(feature_table, ctx.database, "FEATURES")
+    
+    warehouse = ctx.warehouse
     
     # Get features from Feature Store
-    fs = FeatureStore(
-        session=session,
-        database=db_name,
-        name=schema_name,
-        default_warehouse=warehouse,
-        creation_mode=CreationMode.CREATE_IF_NOT_EXIST
-    )
+    fs = get_feature_store(session, db_name, schema_name, warehouse)
     
+    # Read the materialized Dynamic Table; feature_df would re-run the
+    # indicator windows over the raw prices
     fv = fs.get_feature_view(name=fv_name, version="v1")
-    df_features = fv.feature_df
+    df_features = session.table(fv.fully_qualified_name())
     
-    # Load strategy from registry
-    reg = Registry(session=session)
-    model = reg.get_model(model_name)
+    # Load the default (latest registered) strategy version from registry
+    strategy_ref = default_strategy_version(session, model_name)
     
-    # Get latest version
-    versions = model.versions()
-    if not versions:
+    if strategy_ref is None:
+        # Registration hasn't succeeded yet (e.g. this task was run on its own)
+        logger.info(f"No versions of {model_name} yet, registering strategy before generating signals")
+        strategy_registration_task(session, feature_table, model_name, "")
+        strategy_ref = default_strategy_version(session, model_name)
+    
+    if strategy_ref is None:
         raise ValueError(f"No versions found for strategy {model_name}")
-    strategy_ref = versions[0]
     logger.info(f"Using strategy version: {strategy_ref.version_name}")
     
-    # Run the strategy (this calls the predict method of our CustomModel)
-    signals_df = strategy_ref.run(df_features, function_name="predict")
+    # Metadata columns, added in the same projection as the signals
+    metadata_cols = [
+        F.current_timestamp().alias("SIGNAL_TIMESTAMP"),
+        F.lit(strategy_ref.version_name).alias("STRATEGY_VERSION"),
+    ]
     
-    # Add metadata
-    signals_df = signals_df.with_column("SIGNAL_TIMESTAMP", F.current_timestamp())
-    signals_df = signals_df.with_column("STRATEGY_VERSION", F.lit(strategy_ref.version_name))
+    if pushdown:
+        # Everything stays in Snowflake's vectorized SQL engine
+        strategy = MomentumStrategy(custom_model.ModelContext())
+        signals_df = df_features.select(*strategy.signal_columns(), *metadata_cols)
+    else:
+        # Run the strategy (this calls the predict method of our CustomModel)
+        signals_df = strategy_ref.run(df_features, function_name="predict")
+        signals_df = signals_df.select("*", *metadata_cols)
     
     # Save signals
     signals_df.write.mode("overwrite").save_as_table(output_table)
     
-    # Log summary
-    signal_counts = signals_df.group_by("SIGNAL").count().collect()
-    logger.info(f"Signal generation complete: {signal_counts}")
+    # Log summary from the table just written (it is overwritten each run),
+    # rather than evaluating signals_df a second time. The breakdown only feeds
+    # this log line, so the query is skipped when INFO isn't being logged.
+    if logger.isEnabledFor(logging.INFO):
+        # Fetched as Arrow into pandas, rather than built into Row objects
+        signal_counts = session.sql(
+            f"SELECT SIGNAL, COUNT(*) AS COUNT FROM {output_table} GROUP BY SIGNAL"
+        ).to_pandas()
+        logger.info(f"Signal generation complete: {signal_counts.to_dict('records')}")
     
     return f"Success: Trading signals saved to {output_table}"
 
@@ -455,37 +997,137 @@ def signal_generation_task(session: Session, feature_table: str, model_name: str
 # UTILITY FUNCTIONS - Technical Indicator Calculations
 # =============================================================================
 
+@njit(cache=True)
+def _rsi_from_averages(avg_gain, avg_loss):
+    if avg_loss == 0.0:
+        return 100.0 if avg_gain > 0.0 else np.nan
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+@njit(cache=True)
+def _rsi_wilder_loop(prices, period):
+    n = prices.shape[0]
+    rsi = np.full(n, np.nan)
+    if n <= period:
+        return rsi
+    
+    # Seed with the simple average of the first `period` changes
+    avg_gain = 0.0
+    avg_loss = 0.0
+    for i in range(1, period + 1):
+        change = prices[i] - prices[i - 1]
+        if change > 0.0:
+            avg_gain += change
+        else:
+            avg_loss -= change
+    avg_gain /= period
+    avg_loss /= period
+    rsi[period] = _rsi_from_averages(avg_gain, avg_loss)
+    
+    # Wilder's smoothing: one multiply-add per step
+    for i in range(period + 1, n):
+        change = prices[i] - prices[i - 1]
+        gain = change if change > 0.0 else 0.0
+        loss = -change if change < 0.0 else 0.0
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+        rsi[i] = _rsi_from_averages(avg_gain, avg_loss)
+    
+    return rsi
+
+
 def calculate_rsi(prices: pd.Series, period: int = 14) -> pd.Series:
     """
-    Calculate Relative Strength Index (RSI).
+    Calculate Relative Strength Index (RSI) with Wilder's smoothing, the same
+    definition the Feature View's RSI_14 uses (see wilder_sum_sql).
     
     RSI = 100 - (100 / (1 + RS))
-    RS = Average Gain / Average Loss
+    RS = Average Gain / Average Loss, where the averages start as the simple
+    mean of the first `period` changes and are then smoothed recursively:
+    avg = (prev_avg * (period - 1) + current) / period
     
     Args:
         prices: Series of closing prices
         period: RSI period (default 14)
     
     Returns:
-        Series of RSI values
+        Series of RSI values (NaN until `period` changes are available)
     """
-    delta = prices.diff()
-    
-    gain = delta.where(delta > 0, 0)
-    loss = (-delta).where(delta < 0, 0)
-    
-    avg_gain = gain.rolling(window=period, min_periods=period).mean()
-    avg_loss = loss.rolling(window=period, min_periods=period).mean()
+    if NUMBA_AVAILABLE or len(prices) <= period:
+        rsi = _rsi_wilder_loop(prices.to_numpy(dtype=np.float64, copy=False), period)
+        return pd.Series(rsi, index=prices.index)
+    
+    # Without Numba the loop would run in Python. Wilder's smoothing is an EWM
+    # with alpha = 1 / period, so seed it with the simple average of the first
+    # `period` changes and let pandas' ewm run the recursion.
+    delta = prices.astype(np.float64).diff()
+    seed = delta.iloc[1:period + 1]
+    gain = delta.clip(lower=0).iloc[period:].copy()
+    loss = (-delta).clip(lower=0).iloc[period:].copy()
+    gain.iloc[0] = seed.clip(lower=0).mean()
+    loss.iloc[0] = (-seed).clip(lower=0).mean()
+    avg_gain = gain.ewm(alpha=1 / period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1 / period, adjust=False).mean()
+    rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+    return rsi.reindex(prices.index)
+
+
+@njit(parallel=True, cache=True)
+def _rsi_rows(prices, period):
+    out = np.empty(prices.shape)
+    for row in prange(prices.shape[0]):
+        out[row] = _rsi_wilder_loop(prices[row], period)
+    return out
+
+
+def calculate_rsi_matrix(prices: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    Wilder RSI for many assets at once.
     
-    rs = avg_gain / avg_loss
-    rsi = 100 - (100 / (1 + rs))
+    Args:
+        prices: 2D array of closing prices, one row per asset (n_assets, n_days)
+        period: RSI period (default 14)
     
-    return rsi
+    Returns:
+        Array of the same shape; rows are computed in parallel when Numba is available
+    """
+    return _rsi_rows(np.ascontiguousarray(prices, dtype=np.float64), period)
+
+
+@njit(cache=True)
+def _multi_sma(prices, windows):
+    n = prices.shape[0]
+    out = np.full((n, windows.shape[0]), np.nan)
+    sums = np.zeros(windows.shape[0])
+    nans = np.zeros(windows.shape[0], dtype=np.int64)
+    
+    # One pass over the prices updates a running sum per window. NaNs are
+    # counted instead of summed, so an average is NaN only while one is
+    # inside its window, as with rolling().mean()
+    for i in range(n):
+        for k in range(windows.shape[0]):
+            window = windows[k]
+            value = prices[i]
+            if np.isnan(value):
+                nans[k] += 1
+            else:
+                sums[k] += value
+            if i >= window:
+                old = prices[i - window]
+                if np.isnan(old):
+                    nans[k] -= 1
+                else:
+                    sums[k] -= old
+            if i >= window - 1 and nans[k] == 0:
+                out[i, k] = sums[k] / window
+    
+    return out
 
 
 def calculate_moving_averages(prices: pd.Series, windows: List[int] = [20, 50]) -> Dict[str, pd.Series]:
     """
-    Calculate moving averages for given windows.
+    Calculate moving averages for given windows in a single fused pass.
+    Like rolling().mean(), an average is NaN while its window holds a NaN.
     
     Args:
         prices: Series of closing prices
@@ -494,10 +1136,69 @@ def calculate_moving_averages(prices: pd.Series, windows: List[int] = [20, 50])
     Returns:
         Dictionary of MA series
     """
-    result = {}
-    for window in windows:
-        result[f'MA_{window}'] = prices.rolling(window=window, min_periods=window).mean()
-    return result
+    averages = _multi_sma(prices.to_numpy(dtype=np.float64, copy=False), np.asarray(windows, dtype=np.int64))
+    return {
+        f'MA_{window}': pd.Series(averages[:, k], index=prices.index)
+        for k, window in enumerate(windows)
+    }
+
+
+@njit(cache=True)
+def _rolling_std_loop(values, window):
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    count = 0
+    nans = 0
+    mean = 0.0
+    m2 = 0.0
+    
+    # Welford's update: each value enters the window once and leaves once.
+    # NaNs are counted rather than accumulated, so the result is NaN only while
+    # one is inside the window, as with rolling().std()
+    for i in range(n):
+        if i >= window:
+            old = values[i - window]
+            if np.isnan(old):
+                nans -= 1
+            elif count == 1:
+                count = 0
+                mean = 0.0
+                m2 = 0.0
+            else:
+                count -= 1
+                delta = old - mean
+                mean -= delta / count
+                m2 -= delta * (old - mean)
+        value = values[i]
+        if np.isnan(value):
+            nans += 1
+        else:
+            count += 1
+            delta = value - mean
+            mean += delta / count
+            m2 += delta * (value - mean)
+        if i >= window - 1 and nans == 0:
+            out[i] = np.sqrt(max(m2, 0.0) / (window - 1))
+    
+    return out
+
+
+def _volatility_array(values: np.ndarray, window: int) -> np.ndarray:
+    volatility = np.full(values.shape[0], np.nan)
+    
+    if values.shape[0] > window:
+        returns = np.diff(values) / values[:-1]
+        if bn is not None:
+            rolling_std = bn.move_std(returns, window=window, min_count=window, ddof=1)
+        elif NUMBA_AVAILABLE:
+            rolling_std = _rolling_std_loop(returns, window)
+        else:
+            rolling_std = np.full(returns.shape[0], np.nan)
+            rolling_std[window - 1:] = np.lib.stride_tricks.sliding_window_view(returns, window).std(axis=1, ddof=1)
+        # The first price has no return, so results shift by one
+        volatility[1:] = rolling_std * np.sqrt(252)  # Annualized
+    
+    return volatility
 
 
 def calculate_volatility(prices: pd.Series, window: int = 20) -> pd.Series:
@@ -511,9 +1212,8 @@ def calculate_volatility(prices: pd.Series, window: int = 20) -> pd.Series:
     Returns:
         Series of volatility values
     """
-    returns = prices.pct_change()
-    volatility = returns.rolling(window=window, min_periods=window).std() * np.sqrt(252)  # Annualized
-    return volatility
+    volatility = _volatility_array(prices.to_numpy(dtype=np.float64, copy=False), window)
+    return pd.Series(volatility, index=prices.index)
 
 
 # =============================================================================
@@ -522,37 +1222,57 @@ def calculate_volatility(prices: pd.Series, window: int = 20) -> pd.Series:
 # These functions are called by DAG tasks. They read configuration from
 # session context and invoke the actual task logic.
 
+PipelineTables = namedtuple("PipelineTables", ["source_table", "feature_view", "strategy_name", "output_table"])
+
+
+@functools.lru_cache(maxsize=4)
+def _tables_for_database(db: str) -> PipelineTables:
+    # Derive environment prefix from database name (e.g., DEV_ML_DB -> DEV)
+    env_prefix = db.partition("_")[0]
+    # Source table is in RAW_DB, features are in ML_DB.FEATURES
+    return PipelineTables(
+        source_table=f"{env_prefix}_RAW_DB.PUBLIC.MARKET_DATA",
+        feature_view=f"{db}.FEATURES.ASSET_FEATURES",
+        strategy_name="MOMENTUM_STRATEGY",
+        output_table=f"{db}.OUTPUT.TRADING_SIGNALS",
+    )
+
+
+def _lookback_days(session: Session) -> int:
+    """
+    The DAG's lookback_days config, or the default outside a DAG run (e.g. in
+    an ML Job, whose session isn't part of the task graph).
+    """
+    try:
+        value = session.sql("SELECT SYSTEM$GET_TASK_GRAPH_CONFIG('lookback_days')").collect()[0][0]
+    except Exception:
+        value = None
+    return int(value) if value else DEFAULT_LOOKBACK_DAYS
+
+
+def _resolve_tables(ctx: SessionContext) -> PipelineTables:
+    """Table and strategy names for the session's environment, derived once per database."""
+    return _tables_for_database(ctx.database or "DEV_ML_DB")
+
+
 def main(session: Session) -> str:
     """
     Default main function - runs the full pipeline sequentially.
     Useful for ML Jobs mode where a single job runs everything.
     """
-    # Get database - handle None case
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-    
-    # Derive environment prefix from database name (e.g., DEV_ML_DB -> DEV)
-    env_prefix = db.split("_")[0]
+    # Resolved once and shared, so no task re-queries the session context
+    ctx = session_context(session)
+    source_table, feature_view, strategy_name, output_table = _resolve_tables(ctx)
     
-    # Configuration
-    # Source table is in RAW_DB, features are in ML_DB
-    source_table = f"{env_prefix}_RAW_DB.PUBLIC.MARKET_DATA"
-    feature_view = f"{db}.FEATURES.ASSET_FEATURES"
-    strategy_name = "MOMENTUM_STRATEGY"
-    output_table = f"{db}.OUTPUT.TRADING_SIGNALS"
-    
-    # Run full pipeline
-    result1 = feature_engineering_task(session, source_table, feature_view)
+    # Run sequentially: the tasks share one Session and the cached
+    # FeatureStore/Registry handles, none of which are thread-safe
+    result1 = feature_engineering_task(session, source_table, feature_view, ctx, _lookback_days(session))
     logger.info(result1)
     
     result2 = strategy_registration_task(session, feature_view, strategy_name, "")
     logger.info(result2)
     
-    result3 = signal_generation_task(session, feature_view, strategy_name, output_table)
+    result3 = signal_generation_task(session, feature_view, strategy_name, output_table, ctx=ctx)
     logger.info(result3)
     
     return "Investment strategy pipeline complete"
@@ -560,56 +1280,21 @@ def main(session: Session) -> str:
 
 def feature_engineering_main(session: Session) -> str:
     """Entry point for Technical Indicators stored procedure."""
-    # Get database - handle None case by querying session
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        # Fallback: query the database from session
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-    
-    logger.info(f"Running feature_engineering_main with database: {db}")
-    
-    # Derive environment prefix from database name (e.g., DEV_ML_DB -> DEV)
-    env_prefix = db.split("_")[0]
-    
-    # Source table is in RAW_DB, features are in ML_DB.FEATURES
-    source_table = f"{env_prefix}_RAW_DB.PUBLIC.MARKET_DATA"
-    feature_view = f"{db}.FEATURES.ASSET_FEATURES"
-    
-    logger.info(f"Source: {source_table}, Feature View: {feature_view}")
-    
-    return feature_engineering_task(session, source_table, feature_view)
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    logger.info(f"Source: {tables.source_table}, Feature View: {tables.feature_view}")
+    return feature_engineering_task(session, tables.source_table, tables.feature_view, ctx,
+                                    lookback_days=_lookback_days(session))
 
 
 def strategy_registration_main(session: Session) -> str:
     """Entry point for Strategy Registration stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-    
-    feature_view = f"{db}.FEATURES.ASSET_FEATURES"
-    strategy_name = "MOMENTUM_STRATEGY"
-    
-    return strategy_registration_task(session, feature_view, strategy_name, "")
+    tables = _resolve_tables(session_context(session))
+    return strategy_registration_task(session, tables.feature_view, tables.strategy_name, "")
 
 
 def signal_generation_main(session: Session) -> str:
     """Entry point for Signal Generation stored procedure."""
-    db_raw = session.get_current_database()
-    if db_raw is None:
-        result = session.sql("SELECT CURRENT_DATABASE()").collect()
-        db = result[0][0] if result else "DEV_ML_DB"
-    else:
-        db = db_raw.strip('"')
-    
-    feature_view = f"{db}.FEATURES.ASSET_FEATURES"
-    strategy_name = "MOMENTUM_STRATEGY"
-    output_table = f"{db}.OUTPUT.TRADING_SIGNALS"
-    
-    return signal_generation_task(session, feature_view, strategy_name, output_table)
-
+    ctx = session_context(session)
+    tables = _resolve_tables(ctx)
+    return signal_generation_task(session, tables.feature_view, tables.strategy_name, tables.output_table, ctx=ctx)
@@ -0,0 +1,63 @@
+"""
+Regression tests for strategy_logic's vectorized helpers.
+
+They need the same packages as the pipeline (numpy, pandas, snowflake-ml),
+so they are skipped where those aren't installed.
+"""
+
+import os
+import sys
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pd = pytest.importorskip("pandas")
+pytest.importorskip("snowflake.ml")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import strategy_logic  # noqa: E402
+from snowflake.ml.model import custom_model  # noqa: E402
+
+
+@pytest.mark.parametrize("rsi", [0.15, 0.35, 1.15, 12.25, 29.95])
+def test_predict_reasoning_formats_rsi_like_fstring(rsi):
+    # Oversold RSI with price > MA20 > MA50 is a BUY, so the reasoning is spelled out
+    strategy = strategy_logic.MomentumStrategy(custom_model.ModelContext())
+    result = strategy.predict(pd.DataFrame({
+        "ASSET_ID": ["AAPL"],
+        "RSI_14": [rsi],
+        "MA_20": [100.0],
+        "MA_50": [90.0],
+        "CURRENT_PRICE": [110.0],
+    }))
+    assert result["SIGNAL"][0] == "BUY"
+    assert result["REASONING"][0].startswith(f"RSI={rsi:.1f} ")
+
+
+def _prices_with_gap():
+    rng = np.random.default_rng(0)
+    prices = pd.Series(100.0 * np.cumprod(1.0 + rng.normal(0.0, 0.02, 200)))
+    prices.iloc[60] = np.nan
+    return prices
+
+
+def test_moving_averages_recover_after_nan_like_rolling():
+    prices = _prices_with_gap()
+    averages = strategy_logic.calculate_moving_averages(prices, [20, 50])
+    for window in (20, 50):
+        expected = prices.rolling(window=window, min_periods=window).mean()
+        pd.testing.assert_series_equal(averages[f"MA_{window}"], expected, check_names=False)
+
+
+def test_rolling_std_loop_recovers_after_nan_like_rolling():
+    returns = _prices_with_gap().pct_change(fill_method=None)
+    result = strategy_logic._rolling_std_loop(returns.to_numpy(), 20)
+    expected = returns.rolling(window=20, min_periods=20).std()
+    np.testing.assert_allclose(result, expected.to_numpy(), rtol=1e-9, equal_nan=True)
+
+
+def test_volatility_matches_rolling_with_nan():
+    prices = _prices_with_gap()
+    expected = prices.pct_change(fill_method=None).rolling(window=20, min_periods=20).std() * np.sqrt(252)
+    pd.testing.assert_series_equal(strategy_logic.calculate_volatility(prices), expected, check_names=False)